@@ -0,0 +1,356 @@
+(function(){
+    var LIKE_API_BASE = "https://script.google.com/macros/s/AKfycbxsMQE_DTtT6umyhvr7W1dXPlLlYSZcA3qVjPm_v0u28V0A8ZjoltzN_zeWjQL_yA/exec"; // optional Worker API; fallback to CountAPI
+    var LIKES_TTL = 21600; // seconds a build-time (snapshot) count is trusted
+    var LIKES_SNAPSHOT = ""; // build-time counts file ("" when not built)
+    function adjustMaxImageHeight(){
+      var h = window.innerHeight;
+      var header = document.querySelector('header');
+      var footer = document.querySelector('footer');
+      var nav = document.querySelector('.nav');
+      var share = document.querySelector('.share');
+      var desc = document.querySelector('.desc');
+      var r = 0; [header,footer,nav,share,desc].forEach(function(el){ if(el) r += el.offsetHeight; });
+      r += 40; // breathing room
+      var m = Math.max(120, h - r);
+      document.documentElement.style.setProperty('--img-max-h', m + 'px');
+    }
+    window.addEventListener('load', adjustMaxImageHeight);
+    window.addEventListener('resize', adjustMaxImageHeight);
+
+    // Drop the inline placeholder once the comic has loaded (it would show through transparency)
+    (function(){
+      var img = document.querySelector('.comic img.lqip');
+      if (!img) return;
+      function done(){ img.classList.remove('lqip'); img.style.backgroundImage = ''; }
+      if (img.complete && img.naturalWidth) done(); else img.addEventListener('load', done);
+    })();
+
+    // Keyboard navigation: Left/Right arrows (and h/l) go prev/next
+    function go(href){ if(href) window.location.href = href; }
+    document.addEventListener('keydown', function(e){
+      if (e.defaultPrevented) return;
+      if (e.altKey || e.ctrlKey || e.metaKey) return;
+      var prev = document.querySelector('a.nav-btn.prev') || document.querySelector('a[rel="prev"]');
+      var next = document.querySelector('a.nav-btn.next') || document.querySelector('a[rel="next"]');
+      if (e.key === 'ArrowLeft' || e.key === 'h') { if (prev) { e.preventDefault(); go(prev.getAttribute('href')); } }
+      else if (e.key === 'ArrowRight' || e.key === 'l') { if (next) { e.preventDefault(); go(next.getAttribute('href')); } }
+    });
+    
+// Search autocomplete: content-hashed word-prefix shards listed in a small manifest
+    (function(){
+      var PATH_PREFIX = "/";
+      var SEARCH_INDEX = "search/index.json";
+      var SHARD_FETCH_MAX = 8; // words needing more shards than this are too short to look up
+      function words(s){ return (s||'').toLowerCase().split(/[^a-z0-9]+/).filter(Boolean); }
+      function toItem(d){ return {t:d[0], s:d[1]}; }
+      var box = document.querySelector('.search .box');
+      if (!box || !SEARCH_INDEX) return;
+      var input = box.querySelector('#q');
+      var dd = box.querySelector('.dd');
+      var manifest = null, loading = null, shards = {}, titles = null; var active = -1; var seq = 0;
+      function getJSON(u){ return fetch(PATH_PREFIX+u).then(function(r){ return r.ok ? r.json() : null; }).catch(function(){ return null; }); }
+      function loadManifest(){
+        if (!loading) loading = getJSON(SEARCH_INDEX).then(function(m){ manifest = (m && m.shards) ? m : {shards:{}, browse:[]}; return manifest; });
+        return loading;
+      }
+      function shardKeys(w){ var ks=[]; for (var k in manifest.shards){ if (w.indexOf(k)===0 || k.indexOf(w)===0) ks.push(k); } return ks; }
+      function loadShard(k){
+        if (!shards[k]) shards[k] = getJSON(manifest.shards[k]).then(function(s){ return s || {terms:{}, docs:{}}; });
+        return shards[k];
+      }
+      // Every [title, slug] by id, for matches inside words (see fuzzy)
+      function loadTitles(){
+        if (!titles) titles = manifest.titles ? getJSON(manifest.titles).then(function(d){ return d || []; }) : Promise.resolve([]);
+        return titles;
+      }
+      function norm(s){ return (s||'').toLowerCase().replace(/[^a-z0-9]+/g,''); }
+      function fuzzyScore(q, t){
+        var nq = norm(q), nt = norm(t);
+        if (!nq) return 1e9;
+        var idx = nt.indexOf(nq);
+        if (idx >= 0) return idx;
+        var qi=0, score=0;
+        for (var i=0;i<nt.length && qi<nq.length;i++){ if (nt[i]===nq[qi]){ qi++; score+=i; } }
+        if (qi===nq.length) return 500+score;
+        return 1e9;
+      }
+      // Titles containing q anywhere, or as a subsequence ("align" finds "Misalignment")
+      function fuzzy(q){
+        return loadTitles().then(function(docs){
+          var out = [];
+          docs.forEach(function(d, id){ var s = fuzzyScore(q, d[0]); if (s < 1e9) out.push({id:id, d:d, score:s}); });
+          out.sort(function(a,b){ return a.score-b.score || a.id-b.id; });
+          return out;
+        });
+      }
+      // Comics having a word that starts with w: {id: [title, slug]}
+      function lookup(w){
+        return Promise.all(shardKeys(w).map(loadShard)).then(function(list){
+          var hits = {};
+          list.forEach(function(s){ for (var t in s.terms){ if (t.indexOf(w)===0) s.terms[t].forEach(function(id){ hits[id] = s.docs[id]; }); } });
+          return hits;
+        });
+      }
+      function search(q){
+        var ws = words(q).filter(function(w){ return shardKeys(w).length <= SHARD_FETCH_MAX; });
+        var prefix = !ws.length ? Promise.resolve([]) : Promise.all(ws.map(lookup)).then(function(sets){
+          var out = [];
+          for (var id in sets[0]){ if (sets.every(function(h){ return id in h; })) out.push({id:+id, d:sets[0][id]}); }
+          // Title position of the first word first (description-only matches last), then comic order
+          out.forEach(function(x){ var p = x.d[0].toLowerCase().indexOf(ws[0]); x.score = p >= 0 ? p : 500; });
+          out.sort(function(a,b){ return a.score-b.score || a.id-b.id; });
+          return out;
+        });
+        // Word-prefix hits first, then the title matches they miss
+        return Promise.all([prefix, fuzzy(q)]).then(function(r){
+          var seen = {}, out = [];
+          r[0].concat(r[1]).forEach(function(x){ if (!seen[x.id]) { seen[x.id] = 1; out.push(toItem(x.d)); } });
+          return out;
+        });
+      }
+      function openDD(){ dd.classList.add('open'); }
+      function closeDD(){ dd.classList.remove('open'); active=-1; }
+      function render(list, q){
+        dd.innerHTML='';
+        // Render full result set; .dd limits visible height so ~10 show at once
+        list.forEach(function(it,i){
+          var div=document.createElement('div');
+          div.className='item'+(i===active?' active':'');
+          div.setAttribute('role','option');
+          var title=it.t; var nq=(q||'').trim().toLowerCase();
+          var pos=title.toLowerCase().indexOf(nq);
+          if(nq && pos>=0){
+            div.innerHTML=title.slice(0,pos)+'<em>'+title.slice(pos,pos+nq.length)+'</em>'+title.slice(pos+nq.length);
+          } else { div.textContent=title; }
+          div.addEventListener('mousedown', function(ev){ ev.preventDefault(); window.location.href = PATH_PREFIX+'c/'+it.s+'/'; });
+          dd.appendChild(div);
+        });
+        if (list.length) openDD(); else closeDD();
+      }
+      function update(){
+        var q=input.value; var n=++seq;
+        if (!(q||'').trim()) { render([], q); return; }
+        loadManifest().then(function(){ return search(q); }).then(function(list){ if (n===seq) render(list, q); });
+      }
+      function showAll(){
+        var n=++seq;
+        loadManifest().then(function(m){ if (n===seq && !(input.value||'').trim()) { active=-1; render(m.browse.map(toItem), ''); } });
+      }
+      input.addEventListener('input', function(){ active=-1; update(); });
+      input.addEventListener('focus', function(){ if(!(input.value||'').trim()) showAll(); else update(); });
+      input.addEventListener('click', function(){ if(!(input.value||'').trim()) showAll(); });
+      input.addEventListener('keydown', function(e){
+        var items=dd.querySelectorAll('.item');
+        function highlight(){
+          for (var i=0;i<items.length;i++){
+            items[i].classList.toggle('active', i===active);
+            if (i===active){ items[i].style.background='#0b1f4b'; items[i].style.color='#ffffff'; }
+            else { items[i].style.background=''; items[i].style.color=''; }
+          }
+          if (active>=0 && items[active] && typeof items[active].scrollIntoView==='function'){ try { items[active].scrollIntoView({block:'nearest'}); } catch(e){} }
+        }
+        if(e.key==='ArrowDown'){ e.preventDefault(); if(items.length){ active=(active+1)%items.length; highlight(); } }
+        else if(e.key==='ArrowUp'){ e.preventDefault(); if(items.length){ active=(active-1+items.length)%items.length; highlight(); } }
+        else if(e.key==='Enter'){ if(items.length){ e.preventDefault(); if (active<0) active=0; items[active].dispatchEvent(new Event('mousedown')); } }
+        else if(e.key==='Escape'){ closeDD(); }
+      });
+      document.addEventListener('click', function(e){ if(!box.contains(e.target)) closeDD(); });
+    })();
+    // Lightweight global likes using optional Worker API or CountAPI fallback.
+    // Live counts are kept in localStorage for LIKES_CACHE_TTL so back/forward
+    // navigation shows them at once; the current comic and its neighbours are
+    // read in one batched request, and repeat clicks are merged into one hit.
+    var LIKES_CACHE_TTL = 600; // seconds a cached live count is reused
+    var HIT_DEBOUNCE_MS = 800;
+    var HIT_AMOUNT_MAX = 50; // matches the backends' cap on ?amount=
+    function likeApiBase(){ return LIKE_API_BASE ? LIKE_API_BASE.replace(/\/$/,'') : ''; }
+    function isGAS(base){ return /script\.google\.com\/macros\/s\//.test(base); }
+    function getJSON(u, opts){
+      var o = {mode:'cors', credentials:'omit', cache:(opts && opts.cache) || 'no-store', referrerPolicy:'no-referrer'};
+      if (opts && opts.keepalive) o.keepalive = true;
+      return fetch(u, o).then(function(r){ return r.ok ? r.json() : null; }).catch(function(){ return null; });
+    }
+    function readCount(d){
+      if (!d) return null;
+      if (typeof d.count === 'number') return d.count;
+      if (typeof d.value === 'number') return d.value; // tolerate alt format
+      return null;
+    }
+    function cacheGet(slug){
+      try { var e = JSON.parse(localStorage.getItem('likes:' + slug) || 'null'); return (e && typeof e.c === 'number') ? e : null; }
+      catch(e) { return null; }
+    }
+    function cachePut(slug, count){
+      try { localStorage.setItem('likes:' + slug, JSON.stringify({c: count, t: Date.now()})); } catch(e) {}
+    }
+    function cacheFresh(e){ return !!e && Date.now() - e.t < LIKES_CACHE_TTL * 1000; }
+    // Snapshot counts are trusted for LIKES_TTL from when this browser first
+    // showed them; after that, one live read per TTL refreshes the page
+    function snapshotFresh(slug, count){
+      try {
+        var k = 'likes-snapshot:' + slug, now = Date.now();
+        var seen = JSON.parse(localStorage.getItem(k) || 'null');
+        if (seen && seen.c === count && now - seen.t < LIKES_TTL * 1000) return true;
+        localStorage.setItem(k, JSON.stringify({c: count, t: now}));
+        return !seen || seen.c !== count;
+      } catch(e) { return true; }
+    }
+    // Count from the build's likes snapshot; the file is same-origin and HTTP-cached
+    function snapshotGet(slug){
+      if (!LIKES_SNAPSHOT) return null;
+      return getJSON(LIKES_SNAPSHOT, {cache: 'default'}).then(function(d){
+        return d && d.counts && typeof d.counts[slug] === 'number' ? d.counts[slug] : null;
+      });
+    }
+    function apiGet(slug){
+      var base = likeApiBase();
+      if (!base) return null;
+      var u = isGAS(base)
+        ? base + '?action=likes&slug=' + encodeURIComponent(slug) + '&t=' + Date.now()
+        : base + '/likes?slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
+      return getJSON(u).then(readCount);
+    }
+    // {slug: count} for several slugs in one request; null when the backend has no batch read
+    function apiBatch(slugs){
+      var base = likeApiBase();
+      if (!base || isGAS(base)) return null;
+      var u = base + '/likes?slugs=' + slugs.map(encodeURIComponent).join(',') + '&t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && d.counts ? d.counts : null; });
+    }
+    function apiHit(slug, amount, opts){
+      var base = likeApiBase();
+      if (!base) return null;
+      if (isGAS(base)) {
+        // Apps Script counts one like per request
+        var u = base + '?action=hit&slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
+        var p = getJSON(u, opts);
+        for (var i = 1; i < amount; i++) p = p.then(function(){ return getJSON(base + '?action=hit&slug=' + encodeURIComponent(slug) + '&t=' + Date.now(), opts); });
+        return p.then(readCount);
+      }
+      return getJSON(base + '/hit?slug=' + encodeURIComponent(slug) + '&amount=' + amount + '&t=' + Date.now(), opts).then(readCount);
+    }
+    function countapiGet(ns, key){
+      var u = 'https://api.countapi.xyz/get/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && typeof d.value === 'number' ? d.value : null; });
+    }
+    function countapiUpdate(ns, key, amount, opts){
+      var u = 'https://api.countapi.xyz/update/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?amount=' + String(amount) + '&t=' + Date.now();
+      return getJSON(u, opts).then(function(d){ return d && typeof d.value === 'number' ? d.value : null; });
+    }
+    function countapiCreate(ns, key){
+      var u = 'https://api.countapi.xyz/create?namespace=' + encodeURIComponent(ns) + '&key=' + encodeURIComponent(key) + '&value=0&t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && typeof d.value === 'number' ? d.value : 0; });
+    }
+    function navSlug(sel){
+      var a = document.querySelector(sel);
+      var m = a && (a.getAttribute('href') || '').match(/\/c\/([^\/?#]+)\/?$/);
+      return m ? decodeURIComponent(m[1]) : null;
+    }
+    function setupCountApiLikes(){
+      function showPlusOne(btn){
+        try {
+          var bubble = document.createElement('span');
+          bubble.className = 'plus-one';
+          bubble.textContent = '+1';
+          if (!btn) return;
+          btn.appendChild(bubble);
+          setTimeout(function(){ if (bubble && bubble.parentNode) bubble.parentNode.removeChild(bubble); }, 600);
+        } catch(e) {}
+      }
+      var wrap = document.querySelector('.likes');
+      if (!wrap) return;
+      var NS = 'agicomics';
+      var slug = wrap.getAttribute('data-slug') || '';
+      if (!slug) return;
+      var key = 'like-' + slug;
+      var btn = wrap.querySelector('.like-btn');
+      var cnt = wrap.querySelector('.like-count');
+      btn.setAttribute('aria-pressed', 'false');
+      var pending = 0, timer = null;
+      function show(v){ cnt.textContent = String(v); }
+      function loadCount(){
+        // Try Worker API first if configured; otherwise use CountAPI
+        var init = apiGet(slug);
+        if (init && typeof init.then === 'function'){
+          init.then(function(v){
+            if (typeof v === 'number') { show(v); cachePut(slug, v); }
+            else {
+              countapiGet(NS, key).then(function(v2){ if (typeof v2 === 'number') show(v2); else {
+                countapiCreate(NS, key).then(function(v3){ show(v3 || 0); });
+              } });
+            }
+          });
+        } else {
+          countapiGet(NS, key).then(function(v){
+            if (v === null) {
+              return countapiCreate(NS, key).then(function(v2){ show(v2 || 0); cachePut(slug, v2 || 0); });
+            } else {
+              show(v); cachePut(slug, v);
+            }
+          });
+        }
+      }
+      function loadLive(){
+        // One request for this comic and its stale neighbours, so the next swipe is instant
+        var want = [slug];
+        [navSlug('a.nav-btn.prev'), navSlug('a.nav-btn.next')].forEach(function(s){
+          if (s && want.indexOf(s) < 0 && !cacheFresh(cacheGet(s))) want.push(s);
+        });
+        var batch = apiBatch(want);
+        if (batch) {
+          batch.then(function(counts){
+            if (!counts || typeof counts[slug] !== 'number') return loadCount();
+            want.forEach(function(s){ if (typeof counts[s] === 'number') cachePut(s, counts[s]); });
+            show(counts[slug]);
+          });
+        } else {
+          loadCount();
+        }
+      }
+      var cached = cacheGet(slug);
+      if (cached) show(cached.c);
+      var snap = cacheFresh(cached) ? null : snapshotGet(slug);
+      if (snap) {
+        // The snapshot count is shown without asking the API (unless this browser has a newer, higher one)
+        snap.then(function(v){
+          if (typeof v !== 'number') return loadLive();
+          if (!(cached && cached.t > Date.now() - LIKES_TTL * 1000 && cached.c > v)) show(v);
+          if (!snapshotFresh(slug, v)) loadLive();
+        });
+      } else if (!cacheFresh(cached)) {
+        loadLive();
+      }
+      // Clicks within HIT_DEBOUNCE_MS of each other are sent as one hit
+      function flush(opts){
+        if (timer) { clearTimeout(timer); timer = null; }
+        var amount = Math.min(pending, HIT_AMOUNT_MAX);
+        pending -= amount;
+        if (!amount) return;
+        if (pending) timer = setTimeout(flush, HIT_DEBOUNCE_MS);
+        var inc = apiHit(slug, amount, opts);
+        if (!inc) inc = countapiUpdate(NS, key, amount, opts); // CountAPI fallback
+        inc.then(function(v){
+          if (typeof v === 'number') { if (!pending) show(v); cachePut(slug, v); }
+          else if (!likeApiBase()) countapiGet(NS, key).then(function(v2){ if (typeof v2 === 'number' && !pending) show(v2); });
+        });
+      }
+      btn.addEventListener('click', function(){
+        // Immediate feedback: float +1 and optimistic increment
+        showPlusOne(btn);
+        var cur = (parseInt(cnt.textContent, 10) || 0) + 1;
+        show(cur);
+        cachePut(slug, cur);
+        pending++;
+        if (timer) clearTimeout(timer);
+        timer = setTimeout(flush, HIT_DEBOUNCE_MS);
+      });
+      // Don't drop merged clicks when the reader swipes away first
+      window.addEventListener('pagehide', function(){ if (pending) flush({keepalive: true}); });
+    }
+    if (document.readyState === 'loading') {
+      document.addEventListener('DOMContentLoaded', setupCountApiLikes);
+    } else {
+      setupCountApiLikes();
+    }
+  })();
+(function(){try{var x=document.querySelector('.expl');if(!x) return; var c=x.querySelector('.content'); var b=x.querySelector('.exp-toggle');if(!c||!b) return; function needsToggle(){return c.scrollHeight>c.clientHeight+1;}function setOpen(v){ x.classList.toggle('open', v); b.setAttribute('aria-expanded', v?'true':'false'); b.textContent = (v?'Show less — ':'Show more — ') + (b.textContent.split(' — ').pop()||'Explanation'); }function init(){ if(!needsToggle()){ b.style.display='none'; } else { b.style.display='block'; } }b.addEventListener('click', function(){ setOpen(!x.classList.contains('open')); });setTimeout(init,0); window.addEventListener('resize', function(){ setTimeout(init,0); });}catch(e){}})();
@@ -6,8 +6,64 @@ import sys
 from collections import OrderedDict, defaultdict
 
 
-def git(cmd):
-    return subprocess.check_output(cmd, text=True).strip()
+CHECKPOINT_VERSION = 1
+
+
+def git(cmd, cwd=None):
+    return subprocess.check_output(cmd, text=True, cwd=cwd).strip()
+
+
+def checkpoint_path(root):
+    return os.path.join(root, ".cache", "alias-history.json")
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == CHECKPOINT_VERSION and isinstance(data.get("slugs"), dict):
+            return data
+    except Exception:
+        pass
+    return None
+
+
+def save_checkpoint(path, head, history_slugs):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "head": head, "slugs": history_slugs}, f,
+                  ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def is_ancestor(sha, head, cwd):
+    return subprocess.run(["git", "merge-base", "--is-ancestor", sha, head], cwd=cwd,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+
+def iter_blobs(specs, cwd):
+    """Yield (blob_oid, bytes) for each `<rev>:<path>` spec from one `git cat-file --batch`.
+
+    Specs that don't resolve (e.g. the file was deleted in that commit) are skipped.
+    """
+    proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=cwd,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for spec in specs:
+            # One request in flight at a time keeps both pipes from filling up
+            proc.stdin.write(spec.encode("utf-8") + b"\n")
+            proc.stdin.flush()
+            header = proc.stdout.readline().split()
+            if len(header) != 3:
+                continue  # "<spec> missing" / "ambiguous"
+            body = proc.stdout.read(int(header[2]))
+            proc.stdout.read(1)  # trailing newline
+            yield header[0].decode("ascii"), body
+    finally:
+        proc.stdin.close()
+        proc.stdout.close()
+        proc.wait()
 
 
 def load_json_text(text):
@@ -39,22 +95,32 @@ def main():
             continue
         cur_by_file[fn] = c
 
-    # Walk history and capture slugs seen for each file
+    # Walk history and capture slugs seen for each file, resuming from the
+    # checkpoint when HEAD still descends from the last commit we scanned
     history_slugs = defaultdict(list)  # file -> list of slugs in chronological order
+    ckpt_path = checkpoint_path(root)
     try:
-        commits = git(["git", "rev-list", "--reverse", "HEAD", "--", "comics.json"]).splitlines()
-    except subprocess.CalledProcessError:
+        head = git(["git", "rev-parse", "HEAD"], cwd=root)
+    except (subprocess.CalledProcessError, OSError):
+        head = None
+    rev_range = "HEAD"
+    ckpt = load_checkpoint(ckpt_path) if head else None
+    if ckpt and ckpt.get("head") and is_ancestor(ckpt["head"], head, root):
+        history_slugs.update((fn, list(slugs)) for fn, slugs in ckpt["slugs"].items())
+        rev_range = f"{ckpt['head']}..{head}"
+    try:
+        commits = git(["git", "rev-list", "--reverse", rev_range, "--", "comics.json"], cwd=root).splitlines()
+    except (subprocess.CalledProcessError, OSError):
         commits = []
 
-    for sha in commits:
-        if not sha:
-            continue
-        try:
-            text = git(["git", "show", f"{sha}:comics.json"]) 
-        except subprocess.CalledProcessError:
+    seen_blobs = set()
+    for blob, text in iter_blobs((f"{sha}:comics.json" for sha in commits if sha), root):
+        # A comics.json reverted to an earlier state adds no new slugs
+        if blob in seen_blobs:
             continue
+        seen_blobs.add(blob)
         data = load_json_text(text)
-        if not data or not isinstance(data.get("comics"), list):
+        if not isinstance(data, dict) or not isinstance(data.get("comics"), list):
             continue
         for c in data["comics"]:
             fn = c.get("file")
@@ -65,6 +131,12 @@ def main():
             if slug not in seen:
                 seen.append(slug)
 
+    if head and (commits or not ckpt or ckpt.get("head") != head):
+        try:
+            save_checkpoint(ckpt_path, head, history_slugs)
+        except OSError as e:
+            print(f"WARNING: could not write {ckpt_path}: {e}", file=sys.stderr)
+
     # Update current comics with aliases from history, excluding the current slug
     updated = 0
     for fn, c in cur_by_file.items():
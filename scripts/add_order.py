@@ -3,26 +3,28 @@ import json
 import os
 import sys
 
+from catalog import open_catalog
+
 
 def main():
     root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     path = os.path.join(root, "comics.json")
-    if not os.path.exists(path):
+    if not os.path.exists(path) and not os.environ.get("COMICS_DB"):
         print("ERROR: comics.json not found", file=sys.stderr)
         sys.exit(1)
 
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except Exception as e:
-            print(f"ERROR: failed to parse comics.json: {e}", file=sys.stderr)
-            sys.exit(1)
-
-    comics = data.get("comics")
-    if not isinstance(comics, list):
-        print("ERROR: comics.json does not contain a 'comics' list", file=sys.stderr)
+    try:
+        catalog = open_catalog(root)
+    except json.JSONDecodeError as e:
+        print(f"ERROR: failed to parse comics.json: {e}", file=sys.stderr)
         sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    comics = catalog.all()
 
+    changed = []
     added = 0
     updated = 0
     for i, c in enumerate(comics, start=1):
@@ -33,10 +35,12 @@ def main():
             continue
         c["order"] = i
         added += 1
+        changed.append(c)
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-        f.write("\n")
+    # One transaction for all changed records
+    catalog.update_many(changed)
+    catalog.save()
+    catalog.close()
 
     print(f"Processed {len(comics)} comics; added order to {added}, preserved {updated}")
 
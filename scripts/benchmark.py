@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Benchmark the metadata and build scripts against synthetic comic corpora.
+
+Each tier (default 100 / 1000 / 10000 comics) gets a throwaway project tree:
+random line-art PNGs in comics/, a comics.json with orders and aliases, a git
+history of slug renames, and copies of the scripts. The pipeline is then run
+there and wall time, peak RSS, files written and output bytes are reported.
+
+Runs fully offline (needs Pillow and git). Compare against a saved baseline to
+gate changes:
+
+    python3 scripts/benchmark.py --tiers 100 1000 --save-baseline bench.json
+    python3 scripts/benchmark.py --tiers 100 1000 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS = ("catalog.py", "generate_comics_json.py", "add_aliases_from_history.py", "build_site.py")
+HISTORY_COMMITS = 10
+
+
+def make_line_art(path, rng, scale):
+    from PIL import Image, ImageDraw  # type: ignore
+    # Typical comic strip/panel dimensions, black ink on white
+    w = int(rng.choice((1024, 1341, 1806, 2087, 3763)) * scale) or 1
+    h = int(w * rng.uniform(0.45, 1.5)) or 1
+    img = Image.new("L", (w, h), 255)
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(40, 160)):
+        pts = [(rng.randrange(w), rng.randrange(h)) for _ in range(rng.randint(2, 6))]
+        draw.line(pts, fill=rng.choice((0, 40, 90)), width=rng.randint(1, 4))
+    for _ in range(rng.randint(2, 8)):
+        x, y = rng.randrange(w), rng.randrange(h)
+        draw.rectangle((x, y, x + rng.randint(20, 200), y + rng.randint(20, 120)), outline=0, width=2)
+    img.save(path, format="PNG", optimize=True)
+
+
+def git(tree, *args):
+    subprocess.run(["git", *args], cwd=tree, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def make_corpus(tree, count, seed, scale, src_root):
+    """Create a project tree with `count` comics; returns (seconds, image_bytes)."""
+    t0 = time.perf_counter()
+    rng = random.Random(seed)
+    comics_dir = os.path.join(tree, "comics")
+    os.makedirs(comics_dir)
+    os.makedirs(os.path.join(tree, "scripts"))
+    for name in SCRIPTS:
+        shutil.copy2(os.path.join(src_root, "scripts", name), os.path.join(tree, "scripts", name))
+    shutil.copytree(os.path.join(src_root, "assets"), os.path.join(tree, "assets"))
+    with open(os.path.join(tree, "site_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"site_name": "Bench Comics", "base_url": "https://bench.example", "base_path": "/"}, f)
+
+    # A handful of distinct images reused across the corpus keeps generation
+    # time reasonable while still giving every comic its own file on disk
+    uniques = []
+    for k in range(min(count, 50)):
+        p = os.path.join(tree, f".unique-{k}.png")
+        make_line_art(p, rng, scale)
+        uniques.append(p)
+    image_bytes = 0
+    files = []
+    for n in range(count):
+        name = f"comic_{n:05d}.png"
+        dest = os.path.join(comics_dir, name)
+        shutil.copyfile(uniques[n % len(uniques)], dest)
+        # Make each file unique so content-addressed caches see distinct sources
+        with open(dest, "ab") as f:
+            f.write(n.to_bytes(4, "big"))
+        image_bytes += os.path.getsize(dest)
+        files.append(name)
+    for p in uniques:
+        os.remove(p)
+
+    # History: comics.json committed several times with slugs being renamed,
+    # so add_aliases_from_history.py has real work to do
+    slugs = {name: f"old-{os.path.splitext(name)[0].replace('_', '-')}" for name in files}
+    git(tree, "init", "-q")
+    git(tree, "config", "user.email", "bench@example.invalid")
+    git(tree, "config", "user.name", "bench")
+    for commit in range(HISTORY_COMMITS):
+        for name in rng.sample(files, max(1, count // 20)):
+            slugs[name] = f"{os.path.splitext(name)[0].replace('_', '-')}-r{commit}"
+        entries = []
+        for n, name in enumerate(files):
+            entry = {"file": name, "slug": slugs[name], "title": f"Comic {n}", "description": "",
+                     "created": "2020-01-01T00:00:00", "ext": ".png", "visible": True}
+            if rng.random() < 0.8:
+                entry["order"] = (n + 1) * 10
+            entries.append(entry)
+        with open(os.path.join(tree, "comics.json"), "w", encoding="utf-8") as f:
+            json.dump({"comics": entries}, f, indent=2)
+        git(tree, "add", "comics.json")
+        git(tree, "commit", "-q", "-m", f"comics {commit}")
+    return time.perf_counter() - t0, image_bytes
+
+
+def dir_stats(path):
+    files = total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return files, total
+
+
+def run_step(tree, script, args, env):
+    """Run one script in the tree; returns wall seconds and peak RSS (MB) of the child."""
+    cmd = [sys.executable, os.path.join(tree, "scripts", script), *args]
+    with tempfile.TemporaryFile() as err:
+        t0 = time.perf_counter()
+        p = subprocess.Popen(cmd, cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=err)
+        # wait4 gives this child's own rusage (peak RSS), unlike RUSAGE_CHILDREN
+        _, status, usage = os.wait4(p.pid, 0)
+        wall = time.perf_counter() - t0
+        p.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+        if p.returncode != 0:
+            err.seek(0)
+            raise RuntimeError(f"{script} failed ({p.returncode}):\n{err.read().decode('utf-8', 'replace')}")
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return wall, rss
+
+
+def bench_tier(count, args, src_root):
+    tree = tempfile.mkdtemp(prefix=f"comics-bench-{count}-", dir=args.workdir)
+    results = []
+    try:
+        gen_s, image_bytes = make_corpus(tree, count, args.seed, args.image_scale, src_root)
+        print(f"[{count}] corpus ready in {gen_s:.1f}s ({image_bytes / 1e6:.1f} MB of images)", file=sys.stderr)
+        env = dict(os.environ, BASE_URL="https://bench.example", BASE_PATH="/")
+        env.pop("DERIVATIVE_CACHE_DIR", None)
+        build_args = ["--jobs", str(args.jobs)] if args.jobs else []
+        steps = [
+            ("generate_comics_json", "generate_comics_json.py", [], "comics.json"),
+            ("add_aliases_from_history", "add_aliases_from_history.py", [], "comics.json"),
+            ("build_site (cold)", "build_site.py", build_args, "public"),
+            ("build_site (warm cache)", "build_site.py", build_args, "public"),
+            ("build_site (incremental)", "build_site.py", build_args + ["--incremental"], "public"),
+        ]
+        for label, script, sargs, output in steps:
+            wall, rss = run_step(tree, script, sargs, env)
+            out = os.path.join(tree, output)
+            files, nbytes = dir_stats(out) if os.path.isdir(out) else (1, os.path.getsize(out))
+            results.append({"tier": count, "step": label, "wall_s": round(wall, 3), "peak_rss_mb": round(rss, 1),
+                            "files": files, "bytes": nbytes})
+            print(f"[{count}] {label}: {wall:.2f}s", file=sys.stderr)
+    finally:
+        if args.keep:
+            print(f"[{count}] kept tree at {tree}", file=sys.stderr)
+        else:
+            shutil.rmtree(tree, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print deltas against the baseline; returns the number of regressions."""
+    base = {(r["tier"], r["step"]): r for r in baseline.get("results", [])}
+    regressions = 0
+    print(f"\n{'tier':>6} {'step':<26} {'wall':>10} {'rss':>10} {'bytes':>10}")
+    for r in results:
+        b = base.get((r["tier"], r["step"]))
+        if not b:
+            continue
+        cells = []
+        for key in ("wall_s", "peak_rss_mb", "bytes"):
+            delta = (r[key] - b[key]) / b[key] * 100 if b[key] else 0.0
+            flag = "!" if delta > threshold else " "
+            # Ignore noise on very short steps
+            if flag == "!" and not (key == "wall_s" and r[key] < 0.5):
+                regressions += 1
+            else:
+                flag = " "
+            cells.append(f"{delta:+8.1f}%{flag}")
+        print(f"{r['tier']:>6} {r['step']:<26} {' '.join(cells)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the comic scripts on synthetic corpora.")
+    parser.add_argument("--tiers", type=int, nargs="+", default=[100, 1000, 10000], help="corpus sizes")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--image-scale", type=float, default=1.0,
+                        help="scale factor for synthetic image dimensions (e.g. 0.25 for quick runs)")
+    parser.add_argument("--jobs", type=int, default=None, help="passed to build_site.py --jobs")
+    parser.add_argument("--workdir", default=None, help="where to create the temporary trees")
+    parser.add_argument("--keep", action="store_true", help="keep generated trees for inspection")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a new baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="percent increase counted as a regression (default 20)")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # type: ignore  # noqa: F401
+    except Exception:
+        print("ERROR: Pillow is required to generate synthetic comics (pip install Pillow)", file=sys.stderr)
+        sys.exit(1)
+
+    src_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    results = []
+    for count in args.tiers:
+        results.extend(bench_tier(count, args, src_root))
+
+    print(f"{'tier':>6} {'step':<26} {'wall s':>8} {'rss MB':>8} {'files':>7} {'bytes':>12}")
+    for r in results:
+        print(f"{r['tier']:>6} {r['step']:<26} {r['wall_s']:>8.2f} {r['peak_rss_mb']:>8.1f} {r['files']:>7} {r['bytes']:>12}")
+
+    doc = {"python": sys.version.split()[0], "seed": args.seed, "image_scale": args.image_scale, "results": results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(doc, f, indent=2)
+                f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{regressions} regression(s) above {args.threshold:.0f}%", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
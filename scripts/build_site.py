@@ -1,12 +1,50 @@
 #!/usr/bin/env python3
+import argparse
+import base64
+import contextlib
+import gzip
+import hashlib
 import json
 import os
 import re
 import shutil
+import struct
 import sys
 import time
-import subprocess
-from urllib.parse import quote_plus
+from urllib.parse import quote, quote_plus
+from xml.sax.saxutils import escape as xml_escape
+
+from catalog import StatCache, open_catalog, stat_cache_path
+
+# Image derivative settings (responsive WebP ladder + social share card)
+WEBP_WIDTHS = (640, 980, 1960)
+WEBP_METHOD = 5
+SHARE_W, SHARE_H = 1200, 630
+SHARE_BG = (11, 15, 26)  # dark background to match site
+SHARE_JPEG_QUALITY = 85
+# Inline placeholder painted behind the comic until it loads (longest side, px)
+LQIP_SIZE = 32
+LQIP_QUALITY = 40
+
+# Client search index: title words are filed under prefix shards, and a shard
+# holding more than SEARCH_SHARD_MAX postings is split on a longer prefix (up to
+# SEARCH_PREFIX_MAX characters). The first SEARCH_BROWSE_MAX comics are listed
+# in the manifest itself for the empty-query dropdown.
+SEARCH_MANIFEST = "search/index.json"
+SEARCH_SHARD_MAX = 500
+SEARCH_PREFIX_MAX = 4
+SEARCH_BROWSE_MAX = 100
+
+# Build-time like counts, read by the page script on load. The name is stable
+# (and short-lived in _headers) so new counts don't rename site.js and every page.
+LIKES_SNAPSHOT = "likes-snapshot.json"
+
+# Comic URLs per sitemap file; larger catalogs get a sitemap index (the
+# protocol allows 50,000, smaller files are cheaper to refetch)
+SITEMAP_SHARD_MAX = 5000
+
+# Text outputs that get precompressed .gz (and .br) siblings
+PRECOMPRESS_EXTS = (".html", ".css", ".js", ".json", ".svg", ".txt", ".xml")
 
 
 def read_json(path):
@@ -32,6 +70,961 @@ def clean_dir(path):
             # Ignore cleanup failures; continue best-effort
             pass
 
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DerivativeCache:
+    """Content-addressed store for encoded images, kept outside public/.
+
+    Entries are keyed by the source file hash plus the encode parameters, so a
+    comic is only re-encoded when its bytes or the encoder settings change.
+    Entries not used by a build are evicted at the end of it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        # Bytes actually written: new entries plus copies made by place()
+        self.bytes_written = 0
+
+    def key(self, src_hash, kind, params):
+        blob = json.dumps({"src": src_hash, "kind": kind, "params": params}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key, ext):
+        return os.path.join(self.path, key[:2], key + ext)
+
+    def lookup(self, key, ext):
+        p = self.entry_path(key, ext)
+        self.used.add(key + ext)
+        if os.path.isfile(p):
+            self.hits += 1
+            return p
+        self.misses += 1
+        return None
+
+    def store(self, key, ext, save):
+        """Call save(tmp_path) and atomically move the result into the cache."""
+        p = self.entry_path(key, ext)
+        ensure_dir(os.path.dirname(p))
+        tmp = f"{p}.{os.getpid()}.tmp"
+        try:
+            save(tmp)
+            os.replace(tmp, p)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.used.add(key + ext)
+        self.bytes_written += os.path.getsize(p)
+        return p
+
+    def place(self, entry, dest):
+        """Publish entry at dest; returns the bytes copied (0 when hardlinked)."""
+        # Hardlink when possible (same filesystem); fall back to a copy
+        if os.path.exists(dest):
+            if os.path.samefile(entry, dest):
+                return 0
+            os.remove(dest)
+        try:
+            os.link(entry, dest)
+            return 0
+        except OSError:
+            shutil.copy2(entry, dest)
+        nbytes = os.path.getsize(dest)
+        self.bytes_written += nbytes
+        return nbytes
+
+    def evict_unused(self):
+        removed = 0
+        if not os.path.isdir(self.path):
+            return removed
+        for shard in os.listdir(self.path):
+            d = os.path.join(self.path, shard)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if name in self.used:
+                    continue
+                try:
+                    os.remove(os.path.join(d, name))
+                    removed += 1
+                except Exception:
+                    pass
+            try:
+                if not os.listdir(d):
+                    os.rmdir(d)
+            except Exception:
+                pass
+        return removed
+
+
+def fingerprint(obj):
+    blob = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def build_manifest_path(root):
+    return os.path.join(root, ".cache", "build-manifest.json")
+
+
+class OutputWriter:
+    """Writes build outputs under out_dir and records them in a build manifest.
+
+    The manifest maps each output path (relative to out_dir) to the fingerprint
+    of the inputs it was produced from. In incremental mode an output is only
+    rewritten when its fingerprint changed, and finish() deletes outputs the
+    previous build produced but this one did not (removed slugs, aliases, ...).
+    """
+
+    def __init__(self, out_dir, manifest_path, incremental=False):
+        self.out_dir = out_dir
+        self.manifest_path = manifest_path
+        self.prev = {}
+        self.cur = {}
+        self.written = 0
+        self.skipped = 0
+        self.bytes_written = 0
+        self.incremental = False
+        if incremental:
+            try:
+                data = read_json(manifest_path)
+                if isinstance(data, dict) and isinstance(data.get("outputs"), dict):
+                    self.prev = data["outputs"]
+                    self.incremental = True
+            except Exception:
+                pass
+            if not self.incremental:
+                print("NOTE: No build manifest found; running a full build", file=sys.stderr)
+
+    def path(self, rel):
+        return os.path.join(self.out_dir, *rel.split("/"))
+
+    def fresh(self, rel, fp):
+        """True if rel was produced from the same inputs last build and is still on disk."""
+        return self.incremental and self.prev.get(rel) == fp and os.path.isfile(self.path(rel))
+
+    def keep(self, rel, fp):
+        self.cur[rel] = fp
+        self.skipped += 1
+
+    def track(self, rel, fp=""):
+        # Record an output written by another stage (e.g. images)
+        self.cur[rel] = fp
+
+    def write_text(self, rel, text, fp=None):
+        if fp is None:
+            fp = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.fresh(rel, fp):
+            self.keep(rel, fp)
+            return False
+        dest = self.path(rel)
+        ensure_dir(os.path.dirname(dest))
+        data = text.encode("utf-8")
+        with open(dest, "wb") as f:
+            f.write(data)
+        self.cur[rel] = fp
+        self.written += 1
+        self.bytes_written += len(data)
+        return True
+
+    def copy_file(self, src, rel):
+        fp = file_sha256(src)
+        if self.fresh(rel, fp):
+            self.keep(rel, fp)
+            return False
+        dest = self.path(rel)
+        ensure_dir(os.path.dirname(dest))
+        shutil.copy2(src, dest)
+        self.cur[rel] = fp
+        self.written += 1
+        self.bytes_written += os.path.getsize(dest)
+        return True
+
+    def finish(self):
+        """Delete outputs that are no longer produced and save the manifest."""
+        removed = 0
+        for rel in sorted(set(self.prev) - set(self.cur)):
+            dest = self.path(rel)
+            try:
+                if os.path.isfile(dest):
+                    os.remove(dest)
+                    removed += 1
+                # Prune directories left empty (e.g. c/<old-alias>/)
+                d = os.path.dirname(dest)
+                while os.path.abspath(d) != os.path.abspath(self.out_dir) and os.path.isdir(d) and not os.listdir(d):
+                    os.rmdir(d)
+                    d = os.path.dirname(d)
+            except Exception:
+                pass
+        ensure_dir(os.path.dirname(self.manifest_path))
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"outputs": self.cur}, f, indent=1, sort_keys=True)
+        return removed
+
+
+class BuildProfiler:
+    """Records wall time, CPU time and bytes written per build stage and comic.
+
+    Spans are kept as Chrome trace "complete" events (load the JSON in
+    chrome://tracing or ui.perfetto.dev). A span opened inside another span
+    for the same comic is marked nested so per-comic totals don't double
+    count. When disabled, every call is a cheap no-op.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self._open = []
+
+    def begin(self, name, comic=None):
+        if not self.enabled:
+            return None
+        args = {}
+        if comic:
+            args["comic"] = comic
+            if any(sp["args"].get("comic") == comic for sp in self._open):
+                args["nested"] = True
+        sp = {"name": name, "args": args, "t0": time.perf_counter_ns(), "c0": time.process_time_ns()}
+        self._open.append(sp)
+        return sp
+
+    def end(self, sp, nbytes=None):
+        if sp is None:
+            return
+        t1, c1 = time.perf_counter_ns(), time.process_time_ns()
+        if sp in self._open:
+            self._open.remove(sp)
+        args = sp["args"]
+        args["cpu_ms"] = round((c1 - sp["c0"]) / 1e6, 3)
+        if nbytes is not None:
+            args["bytes"] = int(nbytes)
+        self.events.append({
+            "name": sp["name"], "ph": "X", "pid": os.getpid(), "tid": 0,
+            "ts": sp["t0"] / 1000.0, "dur": (t1 - sp["t0"]) / 1000.0, "args": args,
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, comic=None):
+        """Context manager form of begin/end; set ["bytes"] on the yielded dict."""
+        sp = self.begin(name, comic)
+        extra = {}
+        try:
+            yield extra
+        finally:
+            self.end(sp, extra.get("bytes"))
+
+    def write_trace(self, path):
+        t0 = min((e["ts"] for e in self.events), default=0)
+        events = [dict(e, ts=round(e["ts"] - t0, 3), dur=round(e["dur"], 3)) for e in self.events]
+        ensure_dir(os.path.dirname(os.path.abspath(path)))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self, top=10):
+        stages = {}
+        comics = {}
+        for e in self.events:
+            a = e["args"]
+            st = stages.setdefault(e["name"], [0.0, 0.0, 0, 0])
+            st[0] += e["dur"] / 1000.0
+            st[1] += a.get("cpu_ms", 0.0)
+            st[2] += a.get("bytes", 0)
+            st[3] += 1
+            if a.get("comic") and not a.get("nested"):
+                cm = comics.setdefault(a["comic"], [0.0, 0.0, 0])
+                cm[0] += e["dur"] / 1000.0
+                cm[1] += a.get("cpu_ms", 0.0)
+                cm[2] += a.get("bytes", 0)
+        lines = [f"{'stage':<20} {'wall ms':>10} {'cpu ms':>10} {'bytes':>12} {'count':>6}"]
+        for name, (wall, cpu, nbytes, count) in sorted(stages.items(), key=lambda kv: -kv[1][0]):
+            lines.append(f"{name:<20} {wall:>10.1f} {cpu:>10.1f} {nbytes:>12} {count:>6}")
+        lines.append("")
+        lines.append(f"Top {top} slowest comics (wall ms, cpu ms, bytes written):")
+        for slug, (wall, cpu, nbytes) in sorted(comics.items(), key=lambda kv: -kv[1][0])[:top]:
+            lines.append(f"  {slug:<40} {wall:>10.1f} {cpu:>10.1f} {nbytes:>12}")
+        rss = peak_rss_mb()
+        if rss:
+            lines.append("")
+            lines.append(f"Peak RSS: {rss[0]:.1f} MB (build), {rss[1]:.1f} MB (largest worker)")
+        return "\n".join(lines)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except Exception:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    unit = 1.0 / (1024 * 1024) if sys.platform == "darwin" else 1.0 / 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return own, children
+
+
+def derivative_cache_dir(root):
+    # Persist this directory between CI runs to skip re-encoding unchanged comics
+    return os.environ.get("DERIVATIVE_CACHE_DIR") or os.path.join(root, ".cache", "derivatives")
+
+
+def image_meta_path(root):
+    return os.path.join(root, ".cache", "image-meta.json")
+
+
+# Per-comic image metadata recorded by the image stage; pages are rendered from
+# these fields alone. Variants and the share card are
+# {"file", "width", "height", "bytes", "entry"} where entry names the
+# derivative cache file they were placed from.
+IMAGE_META_VERSION = 1
+IMAGE_META_KEYS = ("file", "src_hash", "width", "height", "mime", "bytes", "original", "variants", "share", "lqip")
+
+
+def load_image_meta(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == IMAGE_META_VERSION and isinstance(data.get("comics"), dict):
+            return data["comics"]
+    except Exception:
+        pass
+    return {}
+
+
+def save_image_meta(path, records):
+    ensure_dir(os.path.dirname(path))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": IMAGE_META_VERSION, "comics": records}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def read_image_header(path):
+    """(width, height, mime) read from the file header without decoding, or None.
+
+    Covers the formats comics/ accepts (PNG, JPEG, GIF, WebP), so page
+    dimensions are known even when Pillow is not installed.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(30)
+            if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+                w, h = struct.unpack(">II", head[16:24])
+                return w, h, "image/png"
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                w, h = struct.unpack("<HH", head[6:10])
+                return w, h, "image/gif"
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8X":
+                    w = int.from_bytes(head[24:27], "little") + 1
+                    h = int.from_bytes(head[27:30], "little") + 1
+                elif chunk == b"VP8L":
+                    bits = int.from_bytes(head[21:25], "little")
+                    w, h = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                elif chunk == b"VP8 ":
+                    w, h = struct.unpack("<HH", head[26:30])
+                    w, h = w & 0x3FFF, h & 0x3FFF
+                else:
+                    return None
+                return w, h, "image/webp"
+            if head[:2] == b"\xff\xd8":
+                # Walk the JPEG segments up to the first start-of-frame
+                f.seek(2)
+                while True:
+                    b = f.read(1)
+                    while b and b != b"\xff":
+                        b = f.read(1)
+                    while b == b"\xff":
+                        b = f.read(1)
+                    if not b:
+                        return None
+                    marker = b[0]
+                    if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                        continue  # standalone markers carry no length
+                    length = struct.unpack(">H", f.read(2))[0]
+                    if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                        h, w = struct.unpack(">HH", f.read(5)[1:5])
+                        return w, h, "image/jpeg"
+                    f.seek(length - 2, 1)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def _lanczos(Image):
+    resampling = getattr(Image, "Resampling", None)
+    if resampling is not None and hasattr(resampling, "LANCZOS"):
+        return resampling.LANCZOS
+    return getattr(Image, "LANCZOS", Image.BICUBIC)
+
+
+class SourceImage:
+    """Per-comic image context: decode the source once and share it across outputs.
+
+    Opening only reads the header (size, format). Pixels are decoded on the
+    first call to base() and converted at most once; everything is released
+    on exit so memory stays flat across large catalogs.
+    """
+
+    def __init__(self, path, profiler=None, comic=None):
+        self.path = path
+        self.profiler = profiler or BuildProfiler()
+        self.comic = comic
+        self._img = None
+        self._base = None
+        self.width = self.height = None
+        self.mime = None
+
+    def __enter__(self):
+        from PIL import Image  # type: ignore
+        self._img = Image.open(self.path)
+        self.width, self.height = self._img.size
+        self.mime = Image.MIME.get(self._img.format or "")
+        return self
+
+    def __exit__(self, *exc):
+        self._base = None
+        if self._img is not None:
+            self._img.close()
+            self._img = None
+        return False
+
+    def base(self):
+        """Decoded pixels in RGB, or RGBA when the source carries alpha."""
+        if self._base is None:
+            with self.profiler.span("image.decode", self.comic):
+                img = self._img
+                mode = "RGBA" if img.mode in ("RGBA", "LA") else "RGB"
+                img.load()
+                self._base = img if img.mode == mode else img.convert(mode)
+        return self._base
+
+    def rgb(self):
+        base = self.base()
+        return base if base.mode == "RGB" else base.convert("RGB")
+
+
+def avif_supported():
+    """True if Pillow can encode AVIF, natively or through the pillow-avif-plugin."""
+    try:
+        from PIL import features  # type: ignore
+        if features.check("avif"):
+            return True
+    except Exception:
+        pass
+    try:
+        import pillow_avif  # type: ignore  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def avif_settings():
+    """AVIF encoder settings, or None when disabled (AVIF=0) or unsupported."""
+    if os.environ.get("AVIF", "1").lower() in ("0", "false", "no"):
+        return None
+    if not avif_supported():
+        return None
+    return {"quality": int(os.environ.get("AVIF_QUALITY", "60")), "speed": int(os.environ.get("AVIF_SPEED", "6"))}
+
+
+def webp_tuning_settings():
+    """Per-comic WebP tuning settings (WEBP_TUNING=ssim), or None for fixed WEBP_QUALITY.
+
+    Also None when NumPy, which scores the candidates, is not installed.
+    """
+    if os.environ.get("WEBP_TUNING", "").lower() != "ssim":
+        return None
+    try:
+        import numpy  # type: ignore  # noqa: F401
+    except Exception:
+        return None
+    return {"target": float(os.environ.get("WEBP_SSIM_TARGET", "0.985")),
+            "min_quality": int(os.environ.get("WEBP_MIN_QUALITY", "30")),
+            "max_quality": int(os.environ.get("WEBP_MAX_QUALITY", "90"))}
+
+
+def _luma(im):
+    """Float luma array of an image, flattened onto white if it has alpha."""
+    import numpy as np  # type: ignore
+    from PIL import Image  # type: ignore
+    if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+        im = im.convert("RGBA")
+        bg = Image.new("RGBA", im.size, (255, 255, 255, 255))
+        im = Image.alpha_composite(bg, im)
+    return np.asarray(im.convert("L"), dtype=np.float64)
+
+
+def ssim_score(ref, img, win=8):
+    """SSIM between two luma arrays over win x win box windows.
+
+    Windows that are flat in the reference (blank paper) are left out of the
+    mean so they can't mask damage to ink and lettering; images that are flat
+    everywhere fall back to all windows.
+    """
+    import numpy as np  # type: ignore
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    if min(ref.shape) < win:
+        win = max(1, min(ref.shape))
+
+    def box(x):
+        # Window means via a summed-area table
+        t = np.pad(x, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        return (t[win:, win:] - t[:-win, win:] - t[win:, :-win] + t[:-win, :-win]) / (win * win)
+    mu_a, mu_b = box(ref), box(img)
+    var_a = box(ref * ref) - mu_a ** 2
+    var_b = box(img * img) - mu_b ** 2
+    cov = box(ref * img) - mu_a * mu_b
+    m = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    active = var_a > 4.0
+    return float(m[active].mean() if active.any() else m.mean())
+
+
+def encode_webp(im, settings, method):
+    """Encode im as WebP with tuned settings ({"mode": "lossless" | "near-lossless" | "lossy", ...})."""
+    import io
+    from PIL import Image  # type: ignore
+    buf = io.BytesIO()
+    if settings["mode"] == "lossy":
+        im.save(buf, format="WEBP", optimize=True, quality=settings["quality"], method=method)
+    else:
+        if settings["mode"] == "near-lossless":
+            # Palette-reduce, then let WebP's lossless colour-indexing transform pack it
+            quant = Image.Quantize.FASTOCTREE if im.mode == "RGBA" else Image.Quantize.MEDIANCUT
+            im = im.quantize(colors=settings["colors"], method=quant).convert(im.mode)
+        im.save(buf, format="WEBP", lossless=True, quality=100, method=method)
+    return buf.getvalue()
+
+
+def tune_webp(im, tuning, method):
+    """Pick the smallest WebP encoding of im that meets the SSIM target.
+
+    Lossy quality is binary-searched for the lowest value meeting the target,
+    capped at max_quality for detailed panels that never reach it. Lossless and
+    near-lossless (256-colour palette, then lossless) are tried too unless the
+    panel has too many colours for them to pay off. Returns (settings, bytes).
+    """
+    from PIL import Image  # type: ignore
+    ref = _luma(im)
+
+    def score(data):
+        import io
+        with Image.open(io.BytesIO(data)) as dec:
+            return ssim_score(ref, _luma(dec))
+
+    lo, hi, best = tuning["min_quality"], tuning["max_quality"], None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        cand = {"mode": "lossy", "quality": q}
+        data = encode_webp(im, cand, method)
+        if score(data) >= tuning["target"]:
+            best, hi = (cand, data), q - 1
+        else:
+            lo = q + 1
+    if best is None:
+        cand = {"mode": "lossy", "quality": tuning["max_quality"]}
+        best = (cand, encode_webp(im, cand, method))
+    if im.getcolors(1 << 16) is not None:
+        for cand in ({"mode": "near-lossless", "colors": 256}, {"mode": "lossless"}):
+            data = encode_webp(im, cand, method)
+            if len(data) < len(best[1]) and (cand["mode"] == "lossless" or score(data) >= tuning["target"]):
+                best = (cand, data)
+    return best
+
+
+def webp_choice(cache, src_hash, width, tuning, scaled):
+    """Tuned WebP settings for one comic width, recorded in the derivative cache.
+
+    The record is keyed without the Pillow version, so a Pillow upgrade
+    re-encodes with the chosen settings instead of searching again. Returns
+    (settings, encoded bytes or None when the choice was reused).
+    """
+    key = cache.key(src_hash, "webp-tuning", dict(tuning, width=width, method=WEBP_METHOD))
+    entry = cache.lookup(key, ".json")
+    if entry:
+        try:
+            return read_json(entry), None
+        except Exception:
+            pass
+    settings, data = tune_webp(scaled(), tuning, WEBP_METHOD)
+
+    def save(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+    cache.store(key, ".json", save)
+    return settings, data
+
+
+def lqip_enabled():
+    return os.environ.get("LQIP", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def hashed_name(stem, digest, ext):
+    """Content-fingerprinted filename (safe to serve as immutable)."""
+    return f"{stem}.{digest[:10]}{ext}"
+
+
+def build_image_derivatives(c, src, src_hash, images_out, share_out, cache, result, profiler=None):
+    """Write the WebP (and AVIF) ladder and share card for one comic, reusing cached encodes.
+
+    Files are named by their cache key, which covers the source hash and the
+    encoder settings. Variants written, the inline placeholder (a data URI),
+    source dimensions/mime and NOTE messages are recorded in result.
+    """
+    from PIL import Image  # type: ignore
+    import PIL  # type: ignore
+
+    webp_q = int(os.environ.get('WEBP_QUALITY', '80'))
+    avif = avif_settings()
+    tuning = webp_tuning_settings()
+    LANCZOS = _lanczos(Image)
+    prof = profiler or BuildProfiler()
+    with SourceImage(src, prof, c['slug']) as source:
+        orig_w, orig_h = source.width, source.height
+        result["width"], result["height"] = orig_w, orig_h
+        result["mime"] = source.mime
+        for target_w in WEBP_WIDTHS:
+            if not orig_w or target_w > orig_w:
+                # Skip upscaling beyond original width
+                continue
+            target_h = max(1, int(round(orig_h * (target_w / float(orig_w)))))
+            resized = []
+
+            def scaled():
+                # Resize once per width, shared by the formats that miss the cache
+                if not resized:
+                    resized.append(source.base().resize((target_w, target_h), LANCZOS))
+                return resized[0]
+            if tuning:
+                settings, tuned = webp_choice(cache, src_hash, target_w, tuning, scaled)
+                result["webp_tuning"][str(target_w)] = settings
+
+                def save_tuned(im, p, settings=settings, tuned=tuned):
+                    with open(p, "wb") as f:
+                        f.write(tuned if tuned is not None else encode_webp(im, settings, WEBP_METHOD))
+                tiers = [("webp", ".webp",
+                          {"width": target_w, "tuned": settings, "method": WEBP_METHOD, "pillow": PIL.__version__},
+                          save_tuned)]
+            else:
+                tiers = [("webp", ".webp",
+                          {"width": target_w, "quality": webp_q, "method": WEBP_METHOD, "optimize": True, "pillow": PIL.__version__},
+                          lambda im, p: im.save(p, format="WEBP", optimize=True, quality=webp_q, method=WEBP_METHOD))]
+            if avif:
+                tiers.append(("avif", ".avif",
+                              {"width": target_w, "quality": avif["quality"], "speed": avif["speed"], "pillow": PIL.__version__},
+                              lambda im, p: im.save(p, format="AVIF", quality=avif["quality"], speed=avif["speed"])))
+            for kind, ext, params, save in tiers:
+                key = cache.key(src_hash, kind, params)
+                name = "h/" + hashed_name(f"{c['slug']}-{target_w}", key, ext)
+                dest = os.path.join(images_out, *name.split("/"))
+                entry = cache.lookup(key, ext)
+                sp = prof.begin("image." + kind, c['slug'])
+                written = cache.bytes_written
+                try:
+                    if entry is None:
+                        im = scaled()
+                        entry = cache.store(key, ext, lambda p: save(im, p))
+                    cache.place(entry, dest)
+                    variant = {"file": name, "width": target_w, "height": target_h,
+                               "bytes": os.path.getsize(dest), "entry": key + ext}
+                    result["variants"].setdefault(kind, {})[str(target_w)] = variant
+                    result["outputs"].append(name)
+                except Exception as e:
+                    # The variant is left out of the srcset; say so instead of shipping a thinner ladder silently
+                    result["messages"].append(f"WARNING: Could not generate {kind.upper()} {target_w}w for {c['slug']}: {e}")
+                prof.end(sp, cache.bytes_written - written)
+        if lqip_enabled():
+            sp = prof.begin("image.lqip", c['slug'])
+            written = cache.bytes_written
+            try:
+                params = {"size": LQIP_SIZE, "quality": LQIP_QUALITY, "pillow": PIL.__version__}
+                key = cache.key(src_hash, "lqip", params)
+                entry = cache.lookup(key, ".webp")
+                if entry is None:
+                    scale = min(1.0, LQIP_SIZE / float(max(orig_w, orig_h)))
+                    size = (max(1, int(round(orig_w * scale))), max(1, int(round(orig_h * scale))))
+                    tiny = source.base().resize(size, LANCZOS, reducing_gap=3.0)
+                    entry = cache.store(key, ".webp", lambda p: tiny.save(p, format="WEBP", quality=LQIP_QUALITY, method=6))
+                with open(entry, "rb") as f:
+                    data = f.read()
+                result["lqip"] = "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+            except Exception:
+                pass
+            prof.end(sp, cache.bytes_written - written)
+        # Generate 1200x630 JPG share image (letterboxed to fit)
+        sp = prof.begin("image.share", c['slug'])
+        written = cache.bytes_written
+        try:
+            params = {"size": [SHARE_W, SHARE_H], "bg": list(SHARE_BG), "quality": SHARE_JPEG_QUALITY, "pillow": PIL.__version__}
+            key = cache.key(src_hash, "share", params)
+            share_dest = os.path.join(share_out, hashed_name(f"{c['slug']}-{SHARE_W}x{SHARE_H}", key, ".jpg"))
+            entry = cache.lookup(key, ".jpg")
+            if entry is None:
+                # Preserve aspect ratio: fit within box
+                w, h = orig_w, orig_h
+                if w and h:
+                    scale = min(SHARE_W / float(w), SHARE_H / float(h))
+                    new_w = max(1, int(round(w * scale)))
+                    new_h = max(1, int(round(h * scale)))
+                else:
+                    new_w, new_h = SHARE_W, SHARE_H
+                resized = source.rgb().resize((new_w, new_h), LANCZOS)
+                canvas = Image.new('RGB', (SHARE_W, SHARE_H), SHARE_BG)
+                canvas.paste(resized, ((SHARE_W - new_w) // 2, (SHARE_H - new_h) // 2))
+                entry = cache.store(key, ".jpg", lambda p: canvas.save(p, format='JPEG', quality=SHARE_JPEG_QUALITY, optimize=True, progressive=True))
+            cache.place(entry, share_dest)
+            result["share"] = {"file": "share/" + os.path.basename(share_dest), "width": SHARE_W, "height": SHARE_H,
+                               "bytes": os.path.getsize(share_dest), "entry": key + ".jpg"}
+            result["outputs"].append(result["share"]["file"])
+            prof.end(sp, cache.bytes_written - written)
+        except Exception as e:
+            prof.end(sp, cache.bytes_written - written)
+            result["messages"].append(f"NOTE: Could not generate 1200x630 share image for {src}: {e}")
+
+
+def process_comic_images(c, comics_dir, images_out, share_out, cache_dir, have_pillow, profile=False, src_hash=None):
+    """Copy one comic's original and build its derivatives.
+
+    The original is published twice: at the stable images/<slug><ext> URL
+    for direct links, and fingerprinted under images/h/ for pages to use.
+    Without Pillow only the originals are published, with dimensions read
+    from the file header.
+    Runs in a worker process, so output is returned instead of printed; the
+    parent prints messages in comic order to keep logs deterministic.
+    """
+    result = {"slug": c["slug"], "file": c["file"], "copied": False, "outputs": [], "variants": {}, "webp_tuning": {},
+              "share": None, "original": None, "lqip": None,
+              "width": None, "height": None, "mime": None, "bytes": None, "messages": [],
+              "cache_used": [], "cache_hits": 0, "cache_misses": 0, "bytes_written": 0, "profile": [], "src_hash": None}
+    prof = BuildProfiler(enabled=profile)
+    src = os.path.join(comics_dir, c["file"])
+    if not os.path.isfile(src):
+        result["messages"].append(f"WARNING: Missing file {src}, skipping copy")
+        return result
+    sp = prof.begin("image.comic", c["slug"])
+    dest = os.path.join(images_out, f"{c['slug']}{c['ext']}")
+    # Copy if changed or not exists (copy2 preserves mtime, so any difference means a new source)
+    st = os.stat(src)
+    try:
+        dst = os.stat(dest)
+        changed = dst.st_size != st.st_size or dst.st_mtime != st.st_mtime
+    except OSError:
+        changed = True
+    if changed:
+        # dest may be hardlinked to the previous fingerprinted copy; unlink it
+        # first so writing the new source can't change a published hashed file
+        if os.path.lexists(dest):
+            os.remove(dest)
+        shutil.copy2(src, dest)
+        result["bytes_written"] += st.st_size
+    result["copied"] = True
+    result["bytes"] = st.st_size
+    result["outputs"].append(f"{c['slug']}{c['ext']}")
+    src_hash = result["src_hash"] = src_hash or file_sha256(src)
+    original = "h/" + hashed_name(c["slug"], src_hash, c["ext"])
+    hashed_dest = os.path.join(images_out, *original.split("/"))
+    if not os.path.exists(hashed_dest):
+        ensure_dir(os.path.dirname(hashed_dest))
+        try:
+            os.link(dest, hashed_dest)
+        except OSError:
+            shutil.copy2(dest, hashed_dest)
+            result["bytes_written"] += st.st_size
+    result["original"] = original
+    result["outputs"].append(original)
+    if have_pillow:
+        cache = DerivativeCache(cache_dir)
+        try:
+            build_image_derivatives(c, src, src_hash, images_out, share_out, cache, result, prof)
+        except Exception as e:
+            result["messages"].append(f"NOTE: Could not generate webp for {src}: {e}")
+        result["cache_used"] = sorted(cache.used)
+        result["cache_hits"] = cache.hits
+        result["cache_misses"] = cache.misses
+        result["bytes_written"] += cache.bytes_written
+    else:
+        header = read_image_header(src)
+        if header:
+            result["width"], result["height"], result["mime"] = header
+    prof.end(sp, result["bytes_written"])
+    result["profile"] = prof.events
+    return result
+
+
+def reuse_image_meta(result, prev, cache, images_out):
+    """Fill in derivatives for a comic processed without encoding, from an earlier build's metadata.
+
+    Only applies while the source is unchanged. Recorded variants are placed
+    from the derivative cache; ones whose cache entry is gone are dropped.
+    Returns True when the metadata was reused.
+    """
+    if not prev or not result["src_hash"] or prev.get("src_hash") != result["src_hash"]:
+        return False
+
+    def restore(v):
+        key, ext = os.path.splitext(v["entry"])
+        entry = cache.entry_path(key, ext)
+        if not os.path.isfile(entry):
+            return False
+        cache.place(entry, os.path.join(images_out, *v["file"].split("/")))
+        cache.used.add(v["entry"])
+        result["outputs"].append(v["file"])
+        return True
+    for kind, variants in (prev.get("variants") or {}).items():
+        for w, v in variants.items():
+            if restore(v):
+                result["variants"].setdefault(kind, {})[w] = v
+    if prev.get("share") and restore(prev["share"]):
+        result["share"] = prev["share"]
+    result["lqip"] = prev.get("lqip")
+    for k in ("width", "height", "mime"):
+        result[k] = prev.get(k) or result[k]
+    return True
+
+
+def _process_comic_images_star(args):
+    try:
+        return process_comic_images(*args)
+    except Exception as e:
+        # Name the comic; a traceback from a worker process doesn't survive the trip back
+        raise RuntimeError(f"Image processing failed for {args[0]['file']}: {e!r}") from e
+
+
+def run_image_stage(comics, comics_dir, images_out, share_out, cache, have_pillow, jobs, profiler=None,
+                    stat_cache=None):
+    """Fan comics out to a process pool; returns per-comic results in comic order.
+
+    Source hashes known to stat_cache are handed to the workers so unchanged
+    originals are not re-read; newly computed ones are recorded back into it.
+    """
+    profile = bool(profiler and profiler.enabled)
+    stats = []
+    for c in comics:
+        try:
+            stats.append(os.stat(os.path.join(comics_dir, c["file"])))
+        except OSError:
+            stats.append(None)
+    tasks = []
+    for c, st in zip(comics, stats):
+        known = stat_cache.lookup(c["file"], st) if (stat_cache and st) else None
+        tasks.append((c, comics_dir, images_out, share_out, cache.path, have_pillow, profile, known))
+    pool = None
+    if jobs > 1 and len(tasks) > 1:
+        try:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=min(jobs, len(tasks)))
+        except (ImportError, OSError, NotImplementedError) as e:
+            # e.g. no working multiprocessing on this platform; fall back to serial.
+            # Errors from the workers themselves are not caught here.
+            print(f"NOTE: Parallel image stage unavailable ({e}); running serially", file=sys.stderr)
+    if pool is not None:
+        with pool:
+            results = list(pool.map(_process_comic_images_star, tasks))
+    else:
+        results = [_process_comic_images_star(t) for t in tasks]
+    for c, st, r in zip(comics, stats, results):
+        if stat_cache and st and r["src_hash"]:
+            stat_cache.record(c["file"], st, r["src_hash"])
+        for msg in r["messages"]:
+            print(msg, file=sys.stderr)
+        cache.used.update(r["cache_used"])
+        cache.hits += r["cache_hits"]
+        cache.misses += r["cache_misses"]
+        cache.bytes_written += r["bytes_written"]
+        if profile:
+            profiler.events.extend(r["profile"])
+    return results
+
+
+def compressed_cache_dir(root):
+    return os.path.join(root, ".cache", "compressed")
+
+
+def precompress_encoders():
+    """(suffix, kind, params) for each available encoder, at maximum compression."""
+    encoders = [(".gz", "gzip", {"level": 9})]
+    try:
+        import brotli  # type: ignore  # noqa: F401
+        encoders.append((".br", "brotli", {"quality": 11}))
+    except Exception:
+        pass
+    return encoders
+
+
+def precompress_file(src, dest, kind, params, cache):
+    """Write dest as the compressed form of src, reusing a cached encode of the same bytes.
+
+    Returns (cache_hit, bytes written). Runs in a worker thread; zlib and brotli
+    release the GIL while compressing.
+    """
+    with open(src, "rb") as f:
+        data = f.read()
+    ext = os.path.splitext(dest)[1]
+    key = cache.key(hashlib.sha256(data).hexdigest(), kind, params)
+    entry = cache.entry_path(key, ext)
+    hit = os.path.isfile(entry)
+    if hit:
+        cache.used.add(key + ext)
+    else:
+        if kind == "gzip":
+            # mtime=0 keeps the output a pure function of the input
+            out = gzip.compress(data, compresslevel=params["level"], mtime=0)
+        else:
+            import brotli  # type: ignore
+            out = brotli.compress(data, quality=params["quality"])
+
+        def save(tmp):
+            with open(tmp, "wb") as f:
+                f.write(out)
+        entry = cache.store(key, ext, save)
+    cache.place(entry, dest)
+    return hit, os.path.getsize(dest)
+
+
+def run_precompress_stage(writer, cache, jobs):
+    """Write compressed siblings for text outputs whose content changed.
+
+    In incremental builds a sibling is kept when its source's fingerprint is
+    unchanged; otherwise encodes come from the content-addressed cache when
+    the same bytes were compressed before. Returns (suffixes, written, cache hits).
+    """
+    encoders = precompress_encoders()
+    tasks = []
+    for rel, fp in sorted(writer.cur.items()):
+        if not rel.endswith(PRECOMPRESS_EXTS):
+            continue
+        for suffix, kind, params in encoders:
+            if writer.fresh(rel + suffix, fp):
+                writer.keep(rel + suffix, fp)
+            else:
+                tasks.append((rel, suffix, fp, kind, params))
+
+    def run(task):
+        rel, suffix, _, kind, params = task
+        return precompress_file(writer.path(rel), writer.path(rel + suffix), kind, params, cache)
+
+    if jobs > 1 and len(tasks) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(run, tasks))
+    else:
+        results = [run(t) for t in tasks]
+    hits = 0
+    for (rel, suffix, fp, _, _), (hit, nbytes) in zip(tasks, results):
+        writer.track(rel + suffix, fp)
+        writer.written += 1
+        writer.bytes_written += nbytes
+        hits += hit
+    return [e[0] for e in encoders], len(tasks), hits
+
+
 def load_site_config(root):
     # Basic config; can be expanded or overridden by site_config.json
     cfg = {
@@ -46,12 +1039,37 @@ def load_site_config(root):
         "likes_api_base": os.environ.get("LIKES_API_BASE", None),
         # Optional oEmbed endpoint for rich link previews
         "oembed_endpoint": os.environ.get("OEMBED_ENDPOINT", None),
+        # Write a static oEmbed document per comic (oembed/<slug>.json) and
+        # advertise it instead of oembed_endpoint
+        "oembed_files": os.environ.get("OEMBED_FILES", "1").lower() not in ("0", "false", "no"),
         # Optional: choose a specific comic to show on the homepage
         # by its slug (e.g., "ag-productivity"). If not set, homepage
         # will mirror the latest comic.
         "homepage_slug": None,
         # Prefer WebP for display when available
         "prefer_webp": True,
+        # How numeric (/1/) and alias (/c/<old-slug>/) URLs are published:
+        # "full" writes a complete copy of the comic page, "redirect" writes a
+        # tiny canonical-redirect stub pointing at /c/<slug>/.
+        "alias_pages": os.environ.get("ALIAS_PAGES", "full"),
+        # Also write a host redirect map (_redirects: "<from> <to> 301")
+        "redirect_map": os.environ.get("REDIRECT_MAP", "").lower() in ("1", "true", "yes"),
+        # Also index description words for search (titles are always indexed)
+        "search_descriptions": os.environ.get("SEARCH_DESCRIPTIONS", "").lower() in ("1", "true", "yes"),
+        # Write .gz (and .br with the brotli module) next to text outputs
+        "precompress": os.environ.get("PRECOMPRESS", "1").lower() not in ("0", "false", "no"),
+        # Write sitemap.xml (canonical comic URLs, lastmod from content history)
+        "sitemap": os.environ.get("SITEMAP", "1").lower() not in ("0", "false", "no"),
+        # Write a _headers cache policy (immutable fingerprinted assets, short-lived HTML)
+        "headers_file": os.environ.get("HEADERS_FILE", "1").lower() not in ("0", "false", "no"),
+        "html_max_age": int(os.environ.get("HTML_MAX_AGE", "300")),
+        # Bake like counts into pages: "api" pulls them from likes_api_base at
+        # build time, a path reads a likes.sqlite / JSON stand-in instead
+        "likes_snapshot": os.environ.get("LIKES_SNAPSHOT", None),
+        # Seconds a baked count is trusted before the page asks the live API
+        "likes_ttl": int(os.environ.get("LIKES_TTL", "21600")),
+        # Seconds a live count cached in the browser is reused before re-reading it
+        "likes_cache_ttl": int(os.environ.get("LIKES_CACHE_TTL", "600")),
     }
     cfg_path = os.path.join(root, "site_config.json")
     if os.path.exists(cfg_path):
@@ -255,51 +1273,25 @@ def render_page_html(cfg, comic, index, total, prev_index, next_index, image_url
     return html
 
 
-def render_page_html2(cfg, comic, index, total, prev_slug, next_slug, image_url, page_url, canonical_url, og_image_url, width=None, height=None, path_prefix="/", og_width=None, og_height=None, og_mime=None, build_version=None, updated_time_iso=None):
-    site_name = cfg["site_name"]
-    title = f"{site_name} — #{index}: {comic['title']}"
-    desc = comic.get("description") or cfg.get("description") or comic['title']
-    og_image = to_absolute(cfg["base_url"], og_image_url)
-    canonical = to_absolute(cfg["base_url"], canonical_url)
-
-    # Append cache-busting version to OG URLs to force refresh on social platforms
-    def _with_v(u: str) -> str:
-        try:
-            if not build_version:
-                return u
-            from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
-            p = urlparse(u)
-            q = dict(parse_qsl(p.query))
-            q['v'] = str(build_version)
-            return urlunparse(p._replace(query=urlencode(q)))
-        except Exception:
-            return u
-
-    og_image_v = _with_v(og_image)
-    og_image_secure_v = og_image_v
-    og_url_v = _with_v(canonical)
-
-    share_text = f"{comic['title']}"
-    share_url = canonical
-    x_url = f"https://twitter.com/intent/tweet?text={quote_plus(share_text)}&url={quote_plus(share_url)}"
-    bsky_url = f"https://bsky.app/intent/compose?text={quote_plus(share_text + ' ' + share_url)}"
-    reddit_url = f"https://www.reddit.com/submit?url={quote_plus(share_url)}&title={quote_plus(share_text)}"
-
-    direct_image_link = image_url
-    
-
-    css = """
+# Above-the-fold layout rules, inlined in every page so the comic renders
+# without waiting for the shared stylesheet.
+CRITICAL_CSS = """
     :root{--fg:#e6e6e6;--bg:#0b0b0f;--muted:#9aa0a6;--link:#7aa2ff;--link-hover:#a7c0ff;--img-max-h:75vh}
     *{box-sizing:border-box}
     body{margin:0;font:16px/1.5 -apple-system,BlinkMacSystemFont,Segoe UI,Roboto,Helvetica,Arial,sans-serif;color:var(--fg);background:var(--bg)}
     header,footer{padding:12px 16px}
     header{border-bottom:1px solid #1f232a;display:flex;flex-direction:column;align-items:center;gap:4px}
     header .title{font-weight:700;font-size:20px;text-align:center}
-    header .meta{font-size:14px;color:var(--muted)}
     main{padding:24px 16px;max-width:980px;margin:0 auto}
     .comic{display:flex;flex-direction:column;align-items:center;width:100%}
     .comic .img-wrap{position:relative;display:inline-block}
     .comic img{max-width:100%;height:auto;max-height:var(--img-max-h);object-fit:contain;border-radius:2px}
+    .comic img.lqip{background-position:center;background-size:contain;background-repeat:no-repeat}
+    """
+
+# Shared stylesheet, emitted once per build as site.<hash>.css
+SITE_CSS = """
+    header .meta{font-size:14px;color:var(--muted)}
     .img-top{position:absolute;top:-36px;left:50%;transform:translateX(-50%);max-width:calc(100% - 80px);display:flex;align-items:center;justify-content:center;text-align:center;gap:12px;pointer-events:none}
     .img-top .title{font-weight:700;font-size:18px;color:#e6e6e6;pointer-events:auto}
     .img-top .likes{display:inline-flex;align-items:center;gap:8px;pointer-events:auto}
@@ -325,265 +1317,267 @@ def render_page_html2(cfg, comic, index, total, prev_slug, next_slug, image_url,
     .sr-only{position:absolute;width:1px;height:1px;padding:0;margin:-1px;overflow:hidden;clip:rect(0 0 0 0);white-space:nowrap;border:0}
     """
 
-    # Optional Twitter handle
-    twitter_site_tag = ""
-    if cfg.get("twitter_handle"):
-        twitter_site_tag = f'<meta name="twitter:site" content="{cfg.get("twitter_handle")}">'
-
-    # OG image extra tags
-    og_extras = []
-    if og_width:
-        og_extras.append(f'<meta property="og:image:width" content="{int(og_width)}">')
-    if og_height:
-        og_extras.append(f'<meta property="og:image:height" content="{int(og_height)}">')
-    if og_mime:
-        og_extras.append(f'<meta property="og:image:type" content="{og_mime}">')
-    og_extras_block = "\n  ".join(og_extras)
-
-    # Build description block with line clamp + toggle
-    explanation_html = ""
-    desc_val = (comic.get('description') or '').strip()
-    if desc_val:
-        expl_label2 = (cfg.get("explanation_label") or "Explanation").strip() or "Explanation"
-        explanation_html = (
-            f'<div class="expl">'
-            f'<div class="content">{comic.get("description","")}</div>'
-            f'<button class="exp-toggle" type="button" aria-expanded="false">Show more — {expl_label2}</button>'
-            f'</div>'
-        )
-
-    size_attrs = ""
-    if width and height:
-        size_attrs = f" width=\"{int(width)}\" height=\"{int(height)}\""
-
-    # Optional oEmbed discovery link (JSON)
-    oembed_tag = ""
-    if cfg.get("oembed_endpoint"):
-        disc_href = f"{cfg['oembed_endpoint']}?url={quote_plus(canonical)}"
-        oembed_tag = f"<link rel=\"alternate\" type=\"application/json+oembed\" href=\"{disc_href}\" title=\"{site_name}\">"
-
-    # Optional host normalization: redirect to a preferred host if configured
-    preferred_host = (cfg.get("preferred_host") or "").strip()
-    host_redirect_script = ""
-    if preferred_host:
-        host_redirect_script = (
-            "<script>(function(){try{"
-            "var PH='" + preferred_host + "';"
-            "var h=location.hostname||'';"
-            "if(h && h!==PH && h!=='localhost' && h!=='127.0.0.1'){"
-            "  var proto=(location.protocol||'https:');"
-            "  var url=proto+'//'+PH+location.pathname+location.search+location.hash;"
-            "  if (location.href!==url) location.replace(url);"
-            "}"
-            "}catch(e){}})();</script>"
-        )
-
-    # Prepare JSON-LD (WebPage + primary image)
-    try:
-        ld_image = {"@type": "ImageObject", "url": og_image_v}
-        if og_width and og_height:
-            ld_image["width"] = int(og_width)
-            ld_image["height"] = int(og_height)
-        ld = {
-            "@context": "https://schema.org",
-            "@type": "WebPage",
-            "headline": title,
-            "url": og_url_v,
-            "image": ld_image,
-            "description": desc,
-        }
-        if (cfg.get("author") or "").strip():
-            ld["author"] = {"@type": "Person", "name": (cfg.get("author") or "").strip()}
-        json_ld_block = json.dumps(ld, ensure_ascii=False)
-    except Exception:
-        json_ld_block = "{}"
-
-    html = f"""<!doctype html>
-<html lang=\"en\">\n<head>\n  <meta charset=\"utf-8\">\n  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n  <title>{title}</title>
-  <meta name=\"description\" content=\"{desc}\">\n  <link rel=\"canonical\" href=\"{canonical}\">\n  <meta property=\"og:type\" content=\"website\">\n  <meta property=\"og:title\" content=\"{title}\">\n  <meta property=\"og:description\" content=\"{desc}\">\n  <meta property=\"og:image\" content=\"{og_image_v}\">\n  <meta property=\"og:image:secure_url\" content=\"{og_image_secure_v}\">\n  <meta property=\"og:url\" content=\"{og_url_v}\">\n  <meta property=\"og:site_name\" content=\"{site_name}\">\n  {og_extras_block}\n  <meta property=\"og:updated_time\" content=\"{updated_time_iso}\">\n  <meta name=\"twitter:card\" content=\"summary_large_image\">\n  <meta name=\"twitter:title\" content=\"{title}\">\n  <meta name=\"twitter:description\" content=\"{desc}\">\n  <meta name=\"twitter:image\" content=\"{og_image_v}\">\n  <meta name=\"twitter:image:alt\" content=\"{comic['title']}\">\n  {twitter_site_tag}<style>{css}</style>\n  <script src=\"{path_prefix}swipe.js\" defer></script>
-  {host_redirect_script}
-</head>
-<body>
-  <header>
-    <div class=\"title\">{site_name}</div>
-    <div class=\"search\">\n      <div class=\"box\">\n        <input id=\"q\" type=\"search\" placeholder=\"Search comics...\" autocomplete=\"off\" aria-label=\"Search comics\"/>\n        <div class=\"dd\" role=\"listbox\" aria-label=\"Search suggestions\"></div>\n      </div>\n    </div>
-  </header>
-  <main>
-    <div class=\"comic\">\n      <div class=\"img-wrap\">\n        <a class=\"nav-btn prev\" href=\"{path_prefix}c/{prev_slug}/\" aria-label=\"Previous comic\">&#8592;</a>\n        <a class=\"nav-btn next\" href=\"{path_prefix}c/{next_slug}/\" aria-label=\"Next comic\">&#8594;</a>\n        <img src=\"{image_url}\" alt=\"{comic['title']}\" loading=\"eager\"{size_attrs}>\n      </div>\n      <div class=\"desc\"><strong>{comic['title']}</strong></div>\n      <div class=\"likes\" data-slug=\"{comic['slug']}\"><button class=\"like-btn\" type=\"button\" aria-pressed=\"false\" aria-label=\"Like this comic\"><span class=\"heart\" aria-hidden=\"true\">❤</span></button> <span class=\"like-count\" aria-live=\"polite\">0</span></div>\n      {explanation_html}
-      <div class=\"meta\"><a href=\"{direct_image_link}\">Direct image link</a> • <a href=\"{canonical_url}\">Permalink</a></div>
-      <div class=\"share\">\n+        <span class=\"label\">share on</span>
-        <a href=\"{x_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on X\" title=\"Share on X\"><svg viewBox=\"0 0 24 24\" fill=\"none\" stroke=\"currentColor\" stroke-width=\"2\" stroke-linecap=\"round\" stroke-linejoin=\"round\"><path d=\"M4 4l16 16M20 4L4 20\"/></svg></a>
-        <a href=\"{bsky_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on Bluesky\" title=\"Share on Bluesky\"><svg viewBox=\"0 0 24 24\" fill=\"currentColor\"><path d=\"M6 7c1.5 1.8 3.8 3 6 6 2.2-3 4.5-4.2 6-6-1 3-2.5 5-6 8-3.5-3-5-5-6-8z\"/></svg></a>
-        <a href=\"{reddit_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on Reddit\" title=\"Share on Reddit\"><svg viewBox=\"0 0 24 24\" fill=\"none\" stroke=\"currentColor\" stroke-width=\"1.5\"><circle cx=\"12\" cy=\"13\" r=\"7\"/><circle cx=\"9\" cy=\"12\" r=\"1\" fill=\"currentColor\"/><circle cx=\"15\" cy=\"12\" r=\"1\" fill=\"currentColor\"/><path d=\"M9 15c1.5 1 4.5 1 6 0\"/></svg></a>
-      </div>
-      <div class=\"copyright\">© <a href=\"https://www.dileeplearning.com\" target=\"_blank\" rel=\"noopener noreferrer\">Dileep George</a> • <a href=\"https://blog.dileeplearning.com\" target=\"_blank\" rel=\"noopener noreferrer\">AGI blog</a></div>
-    </div>
-  </main>
-  
-  <script>(function(){{
-    var LIKE_API_BASE = "{(cfg.get('likes_api_base') or '').strip()}"; // optional Worker API; fallback to CountAPI
-    function adjustMaxImageHeight(){{
+# Shared page script (search, keyboard nav, likes, description toggle),
+# emitted once per build as site.<hash>.js. See render_site_js().
+SITE_JS_TEMPLATE = r"""(function(){
+    var LIKE_API_BASE = __LIKE_API_BASE__; // optional Worker API; fallback to CountAPI
+    var LIKES_TTL = __LIKES_TTL__; // seconds a build-time (snapshot) count is trusted
+    var LIKES_SNAPSHOT = __LIKES_SNAPSHOT__; // build-time counts file ("" when not built)
+    function adjustMaxImageHeight(){
       var h = window.innerHeight;
       var header = document.querySelector('header');
       var footer = document.querySelector('footer');
       var nav = document.querySelector('.nav');
       var share = document.querySelector('.share');
       var desc = document.querySelector('.desc');
-      var r = 0; [header,footer,nav,share,desc].forEach(function(el){{ if(el) r += el.offsetHeight; }});
+      var r = 0; [header,footer,nav,share,desc].forEach(function(el){ if(el) r += el.offsetHeight; });
       r += 40; // breathing room
       var m = Math.max(120, h - r);
       document.documentElement.style.setProperty('--img-max-h', m + 'px');
-    }}
+    }
     window.addEventListener('load', adjustMaxImageHeight);
     window.addEventListener('resize', adjustMaxImageHeight);
 
+    // Drop the inline placeholder once the comic has loaded (it would show through transparency)
+    (function(){
+      var img = document.querySelector('.comic img.lqip');
+      if (!img) return;
+      function done(){ img.classList.remove('lqip'); img.style.backgroundImage = ''; }
+      if (img.complete && img.naturalWidth) done(); else img.addEventListener('load', done);
+    })();
+
     // Keyboard navigation: Left/Right arrows (and h/l) go prev/next
-    function go(href){{ if(href) window.location.href = href; }}
-    document.addEventListener('keydown', function(e){{
+    function go(href){ if(href) window.location.href = href; }
+    document.addEventListener('keydown', function(e){
       if (e.defaultPrevented) return;
       if (e.altKey || e.ctrlKey || e.metaKey) return;
       var prev = document.querySelector('a.nav-btn.prev') || document.querySelector('a[rel="prev"]');
       var next = document.querySelector('a.nav-btn.next') || document.querySelector('a[rel="next"]');
-      if (e.key === 'ArrowLeft' || e.key === 'h') {{ if (prev) {{ e.preventDefault(); go(prev.getAttribute('href')); }} }}
-      else if (e.key === 'ArrowRight' || e.key === 'l') {{ if (next) {{ e.preventDefault(); go(next.getAttribute('href')); }} }}
-    }});
+      if (e.key === 'ArrowLeft' || e.key === 'h') { if (prev) { e.preventDefault(); go(prev.getAttribute('href')); } }
+      else if (e.key === 'ArrowRight' || e.key === 'l') { if (next) { e.preventDefault(); go(next.getAttribute('href')); } }
+    });
     
-// Search autocomplete (titles)
-    (function(){{
-      var PATH_PREFIX = "{path_prefix}";
-      function norm(s){{ return (s||'').toLowerCase().replace(/[^a-z0-9]+/g,''); }}
-      function fuzzyScore(q, t){{
+// Search autocomplete: content-hashed word-prefix shards listed in a small manifest
+    (function(){
+      var PATH_PREFIX = __PATH_PREFIX__;
+      var SEARCH_INDEX = __SEARCH_INDEX__;
+      var SHARD_FETCH_MAX = 8; // words needing more shards than this are too short to look up
+      function words(s){ return (s||'').toLowerCase().split(/[^a-z0-9]+/).filter(Boolean); }
+      function toItem(d){ return {t:d[0], s:d[1]}; }
+      var box = document.querySelector('.search .box');
+      if (!box || !SEARCH_INDEX) return;
+      var input = box.querySelector('#q');
+      var dd = box.querySelector('.dd');
+      var manifest = null, loading = null, shards = {}, titles = null; var active = -1; var seq = 0;
+      function getJSON(u){ return fetch(PATH_PREFIX+u).then(function(r){ return r.ok ? r.json() : null; }).catch(function(){ return null; }); }
+      function loadManifest(){
+        if (!loading) loading = getJSON(SEARCH_INDEX).then(function(m){ manifest = (m && m.shards) ? m : {shards:{}, browse:[]}; return manifest; });
+        return loading;
+      }
+      function shardKeys(w){ var ks=[]; for (var k in manifest.shards){ if (w.indexOf(k)===0 || k.indexOf(w)===0) ks.push(k); } return ks; }
+      function loadShard(k){
+        if (!shards[k]) shards[k] = getJSON(manifest.shards[k]).then(function(s){ return s || {terms:{}, docs:{}}; });
+        return shards[k];
+      }
+      // Every [title, slug] by id, for matches inside words (see fuzzy)
+      function loadTitles(){
+        if (!titles) titles = manifest.titles ? getJSON(manifest.titles).then(function(d){ return d || []; }) : Promise.resolve([]);
+        return titles;
+      }
+      function norm(s){ return (s||'').toLowerCase().replace(/[^a-z0-9]+/g,''); }
+      function fuzzyScore(q, t){
         var nq = norm(q), nt = norm(t);
         if (!nq) return 1e9;
         var idx = nt.indexOf(nq);
         if (idx >= 0) return idx;
         var qi=0, score=0;
-        for (var i=0;i<nt.length && qi<nq.length;i++){{ if (nt[i]===nq[qi]){{ qi++; score+=i; }} }}
+        for (var i=0;i<nt.length && qi<nq.length;i++){ if (nt[i]===nq[qi]){ qi++; score+=i; } }
         if (qi===nq.length) return 500+score;
         return 1e9;
-      }}
-      var box = document.querySelector('.search .box');
-      if (!box) return;
-      var input = box.querySelector('#q');
-      var dd = box.querySelector('.dd');
-      var data = null; var active = -1;
-      function openDD(){{ dd.classList.add('open'); }}
-      function closeDD(){{ dd.classList.remove('open'); active=-1; }}
-      function render(list, q){{
+      }
+      // Titles containing q anywhere, or as a subsequence ("align" finds "Misalignment")
+      function fuzzy(q){
+        return loadTitles().then(function(docs){
+          var out = [];
+          docs.forEach(function(d, id){ var s = fuzzyScore(q, d[0]); if (s < 1e9) out.push({id:id, d:d, score:s}); });
+          out.sort(function(a,b){ return a.score-b.score || a.id-b.id; });
+          return out;
+        });
+      }
+      // Comics having a word that starts with w: {id: [title, slug]}
+      function lookup(w){
+        return Promise.all(shardKeys(w).map(loadShard)).then(function(list){
+          var hits = {};
+          list.forEach(function(s){ for (var t in s.terms){ if (t.indexOf(w)===0) s.terms[t].forEach(function(id){ hits[id] = s.docs[id]; }); } });
+          return hits;
+        });
+      }
+      function search(q){
+        var ws = words(q).filter(function(w){ return shardKeys(w).length <= SHARD_FETCH_MAX; });
+        var prefix = !ws.length ? Promise.resolve([]) : Promise.all(ws.map(lookup)).then(function(sets){
+          var out = [];
+          for (var id in sets[0]){ if (sets.every(function(h){ return id in h; })) out.push({id:+id, d:sets[0][id]}); }
+          // Title position of the first word first (description-only matches last), then comic order
+          out.forEach(function(x){ var p = x.d[0].toLowerCase().indexOf(ws[0]); x.score = p >= 0 ? p : 500; });
+          out.sort(function(a,b){ return a.score-b.score || a.id-b.id; });
+          return out;
+        });
+        // Word-prefix hits first, then the title matches they miss
+        return Promise.all([prefix, fuzzy(q)]).then(function(r){
+          var seen = {}, out = [];
+          r[0].concat(r[1]).forEach(function(x){ if (!seen[x.id]) { seen[x.id] = 1; out.push(toItem(x.d)); } });
+          return out;
+        });
+      }
+      function openDD(){ dd.classList.add('open'); }
+      function closeDD(){ dd.classList.remove('open'); active=-1; }
+      function render(list, q){
         dd.innerHTML='';
         // Render full result set; .dd limits visible height so ~10 show at once
-        list.forEach(function(it,i){{
+        list.forEach(function(it,i){
           var div=document.createElement('div');
           div.className='item'+(i===active?' active':'');
           div.setAttribute('role','option');
           var title=it.t; var nq=(q||'').trim().toLowerCase();
           var pos=title.toLowerCase().indexOf(nq);
-          if(nq && pos>=0){{
+          if(nq && pos>=0){
             div.innerHTML=title.slice(0,pos)+'<em>'+title.slice(pos,pos+nq.length)+'</em>'+title.slice(pos+nq.length);
-          }} else {{ div.textContent=title; }}
-          div.addEventListener('mousedown', function(ev){{ ev.preventDefault(); window.location.href = PATH_PREFIX+'c/'+it.s+'/'; }});
+          } else { div.textContent=title; }
+          div.addEventListener('mousedown', function(ev){ ev.preventDefault(); window.location.href = PATH_PREFIX+'c/'+it.s+'/'; });
           dd.appendChild(div);
-        }});
+        });
         if (list.length) openDD(); else closeDD();
-      }}
-      function update(){{ if(!data) return; var q=input.value; var scored=data.map(function(it){{return {{it:it,s:fuzzyScore(q,it.t)}};}}).filter(function(x){{return x.s<1e9;}}); scored.sort(function(a,b){{return a.s-b.s;}}); render(scored.map(function(x){{return x.it;}}), q); }}
-      function showAll(){{ if(!data) return; active=-1; render(data.slice(0, data.length), ''); }}
-      function fetchIndex(){{ fetch(PATH_PREFIX+'search-index.json',{{cache:'no-store'}}).then(function(r){{return r.ok?r.json():[];}}).then(function(j){{ data=Array.isArray(j)?j:[]; if (document.activeElement===input && !(input.value||'').trim()) {{ showAll(); }} else {{ update(); }} }}).catch(function(){{ data=[]; }}); }}
-      input.addEventListener('input', function(){{ active=-1; update(); }});
-      input.addEventListener('focus', function(){{ if(!data) fetchIndex(); else if(!(input.value||'').trim()) showAll(); }});
-      input.addEventListener('click', function(){{ if(data && !(input.value||'').trim()) showAll(); }});
-      input.addEventListener('keydown', function(e){{
+      }
+      function update(){
+        var q=input.value; var n=++seq;
+        if (!(q||'').trim()) { render([], q); return; }
+        loadManifest().then(function(){ return search(q); }).then(function(list){ if (n===seq) render(list, q); });
+      }
+      function showAll(){
+        var n=++seq;
+        loadManifest().then(function(m){ if (n===seq && !(input.value||'').trim()) { active=-1; render(m.browse.map(toItem), ''); } });
+      }
+      input.addEventListener('input', function(){ active=-1; update(); });
+      input.addEventListener('focus', function(){ if(!(input.value||'').trim()) showAll(); else update(); });
+      input.addEventListener('click', function(){ if(!(input.value||'').trim()) showAll(); });
+      input.addEventListener('keydown', function(e){
         var items=dd.querySelectorAll('.item');
-        function highlight(){{
-          for (var i=0;i<items.length;i++){{
+        function highlight(){
+          for (var i=0;i<items.length;i++){
             items[i].classList.toggle('active', i===active);
-            if (i===active){{ items[i].style.background='#0b1f4b'; items[i].style.color='#ffffff'; }}
-            else {{ items[i].style.background=''; items[i].style.color=''; }}
-          }}
-          if (active>=0 && items[active] && typeof items[active].scrollIntoView==='function'){{ try {{ items[active].scrollIntoView({{block:'nearest'}}); }} catch(e){{}} }}
-        }}
-        if(e.key==='ArrowDown'){{ e.preventDefault(); if(items.length){{ active=(active+1)%items.length; highlight(); }} }}
-        else if(e.key==='ArrowUp'){{ e.preventDefault(); if(items.length){{ active=(active-1+items.length)%items.length; highlight(); }} }}
-        else if(e.key==='Enter'){{ if(items.length){{ e.preventDefault(); if (active<0) active=0; items[active].dispatchEvent(new Event('mousedown')); }} }}
-        else if(e.key==='Escape'){{ closeDD(); }}
-      }});
-      document.addEventListener('click', function(e){{ if(!box.contains(e.target)) closeDD(); }});
-      fetchIndex();
-    }})();
-    // Lightweight global likes using optional Worker API or CountAPI fallback
-    function apiGet(slug){{
-      if (!LIKE_API_BASE) return null;
-      var base = LIKE_API_BASE.replace(/\/$/,'');
-      var isGAS = /script\.google\.com\/macros\/s\//.test(base);
-      var u = isGAS
-        ? base + '?action=likes&slug=' + encodeURIComponent(slug) + '&t=' + Date.now()
-        : base + '/likes?slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{
-          if (!d) return null;
-          if (typeof d.count === 'number') return d.count;
-          if (typeof d.value === 'number') return d.value; // tolerate alt format
-          return null;
-        }})
-        .catch(function(){{ return null; }});
-    }}
-    function apiHit(slug){{
-      if (!LIKE_API_BASE) return null;
-      var base = LIKE_API_BASE.replace(/\/$/,'');
-      var isGAS = /script\.google\.com\/macros\/s\//.test(base);
-      var u = isGAS
-        ? base + '?action=hit&slug=' + encodeURIComponent(slug) + '&t=' + Date.now()
-        : base + '/hit?slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{
-          if (!d) return null;
-          if (typeof d.count === 'number') return d.count;
-          if (typeof d.value === 'number') return d.value;
-          return null;
-        }})
-        .catch(function(){{ return null; }});
-    }}
-    function countapiGet(ns, key){{
-      var u = 'https://api.countapi.xyz/get/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{ return d && typeof d.value === 'number' ? d.value : null; }})
-        .catch(function(){{ return null; }});
-    }}
-    function countapiUpdate(ns, key, amount){{
-      var u = 'https://api.countapi.xyz/update/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?amount=' + String(amount) + '&t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{ return d && typeof d.value === 'number' ? d.value : null; }})
-        .catch(function(){{ return null; }});
-    }}
-    function countapiHit(ns, key){{
-      var u = 'https://api.countapi.xyz/hit/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{ return d && typeof d.value === 'number' ? d.value : null; }})
-        .catch(function(){{ return null; }});
-    }}
-    function countapiCreate(ns, key){{
-      var u = 'https://api.countapi.xyz/create?namespace=' + encodeURIComponent(ns) + '&key=' + encodeURIComponent(key) + '&value=0&t=' + Date.now();
-      return fetch(u, {{mode:'cors', credentials:'omit', cache:'no-store', referrerPolicy:'no-referrer'}})
-        .then(function(r){{ return r.ok ? r.json() : null; }})
-        .then(function(d){{ return d && typeof d.value === 'number' ? d.value : 0; }})
-        .catch(function(){{ return 0; }});
-    }}
-    function setupCountApiLikes(){{
-      function showPlusOne(btn){{
-        try {{
+            if (i===active){ items[i].style.background='#0b1f4b'; items[i].style.color='#ffffff'; }
+            else { items[i].style.background=''; items[i].style.color=''; }
+          }
+          if (active>=0 && items[active] && typeof items[active].scrollIntoView==='function'){ try { items[active].scrollIntoView({block:'nearest'}); } catch(e){} }
+        }
+        if(e.key==='ArrowDown'){ e.preventDefault(); if(items.length){ active=(active+1)%items.length; highlight(); } }
+        else if(e.key==='ArrowUp'){ e.preventDefault(); if(items.length){ active=(active-1+items.length)%items.length; highlight(); } }
+        else if(e.key==='Enter'){ if(items.length){ e.preventDefault(); if (active<0) active=0; items[active].dispatchEvent(new Event('mousedown')); } }
+        else if(e.key==='Escape'){ closeDD(); }
+      });
+      document.addEventListener('click', function(e){ if(!box.contains(e.target)) closeDD(); });
+    })();
+    // Lightweight global likes using optional Worker API or CountAPI fallback.
+    // Live counts are kept in localStorage for LIKES_CACHE_TTL so back/forward
+    // navigation shows them at once; the current comic and its neighbours are
+    // read in one batched request, and repeat clicks are merged into one hit.
+    var LIKES_CACHE_TTL = __LIKES_CACHE_TTL__; // seconds a cached live count is reused
+    var HIT_DEBOUNCE_MS = 800;
+    var HIT_AMOUNT_MAX = 50; // matches the backends' cap on ?amount=
+    function likeApiBase(){ return LIKE_API_BASE ? LIKE_API_BASE.replace(/\/$/,'') : ''; }
+    function isGAS(base){ return /script\.google\.com\/macros\/s\//.test(base); }
+    function getJSON(u, opts){
+      var o = {mode:'cors', credentials:'omit', cache:(opts && opts.cache) || 'no-store', referrerPolicy:'no-referrer'};
+      if (opts && opts.keepalive) o.keepalive = true;
+      return fetch(u, o).then(function(r){ return r.ok ? r.json() : null; }).catch(function(){ return null; });
+    }
+    function readCount(d){
+      if (!d) return null;
+      if (typeof d.count === 'number') return d.count;
+      if (typeof d.value === 'number') return d.value; // tolerate alt format
+      return null;
+    }
+    function cacheGet(slug){
+      try { var e = JSON.parse(localStorage.getItem('likes:' + slug) || 'null'); return (e && typeof e.c === 'number') ? e : null; }
+      catch(e) { return null; }
+    }
+    function cachePut(slug, count){
+      try { localStorage.setItem('likes:' + slug, JSON.stringify({c: count, t: Date.now()})); } catch(e) {}
+    }
+    function cacheFresh(e){ return !!e && Date.now() - e.t < LIKES_CACHE_TTL * 1000; }
+    // Snapshot counts are trusted for LIKES_TTL from when this browser first
+    // showed them; after that, one live read per TTL refreshes the page
+    function snapshotFresh(slug, count){
+      try {
+        var k = 'likes-snapshot:' + slug, now = Date.now();
+        var seen = JSON.parse(localStorage.getItem(k) || 'null');
+        if (seen && seen.c === count && now - seen.t < LIKES_TTL * 1000) return true;
+        localStorage.setItem(k, JSON.stringify({c: count, t: now}));
+        return !seen || seen.c !== count;
+      } catch(e) { return true; }
+    }
+    // Count from the build's likes snapshot; the file is same-origin and HTTP-cached
+    function snapshotGet(slug){
+      if (!LIKES_SNAPSHOT) return null;
+      return getJSON(LIKES_SNAPSHOT, {cache: 'default'}).then(function(d){
+        return d && d.counts && typeof d.counts[slug] === 'number' ? d.counts[slug] : null;
+      });
+    }
+    function apiGet(slug){
+      var base = likeApiBase();
+      if (!base) return null;
+      var u = isGAS(base)
+        ? base + '?action=likes&slug=' + encodeURIComponent(slug) + '&t=' + Date.now()
+        : base + '/likes?slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
+      return getJSON(u).then(readCount);
+    }
+    // {slug: count} for several slugs in one request; null when the backend has no batch read
+    function apiBatch(slugs){
+      var base = likeApiBase();
+      if (!base || isGAS(base)) return null;
+      var u = base + '/likes?slugs=' + slugs.map(encodeURIComponent).join(',') + '&t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && d.counts ? d.counts : null; });
+    }
+    function apiHit(slug, amount, opts){
+      var base = likeApiBase();
+      if (!base) return null;
+      if (isGAS(base)) {
+        // Apps Script counts one like per request
+        var u = base + '?action=hit&slug=' + encodeURIComponent(slug) + '&t=' + Date.now();
+        var p = getJSON(u, opts);
+        for (var i = 1; i < amount; i++) p = p.then(function(){ return getJSON(base + '?action=hit&slug=' + encodeURIComponent(slug) + '&t=' + Date.now(), opts); });
+        return p.then(readCount);
+      }
+      return getJSON(base + '/hit?slug=' + encodeURIComponent(slug) + '&amount=' + amount + '&t=' + Date.now(), opts).then(readCount);
+    }
+    function countapiGet(ns, key){
+      var u = 'https://api.countapi.xyz/get/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && typeof d.value === 'number' ? d.value : null; });
+    }
+    function countapiUpdate(ns, key, amount, opts){
+      var u = 'https://api.countapi.xyz/update/' + encodeURIComponent(ns) + '/' + encodeURIComponent(key) + '?amount=' + String(amount) + '&t=' + Date.now();
+      return getJSON(u, opts).then(function(d){ return d && typeof d.value === 'number' ? d.value : null; });
+    }
+    function countapiCreate(ns, key){
+      var u = 'https://api.countapi.xyz/create?namespace=' + encodeURIComponent(ns) + '&key=' + encodeURIComponent(key) + '&value=0&t=' + Date.now();
+      return getJSON(u).then(function(d){ return d && typeof d.value === 'number' ? d.value : 0; });
+    }
+    function navSlug(sel){
+      var a = document.querySelector(sel);
+      var m = a && (a.getAttribute('href') || '').match(/\/c\/([^\/?#]+)\/?$/);
+      return m ? decodeURIComponent(m[1]) : null;
+    }
+    function setupCountApiLikes(){
+      function showPlusOne(btn){
+        try {
           var bubble = document.createElement('span');
           bubble.className = 'plus-one';
           bubble.textContent = '+1';
           if (!btn) return;
           btn.appendChild(bubble);
-          setTimeout(function(){{ if (bubble && bubble.parentNode) bubble.parentNode.removeChild(bubble); }}, 600);
-        }} catch(e) {{}}
-      }}
+          setTimeout(function(){ if (bubble && bubble.parentNode) bubble.parentNode.removeChild(bubble); }, 600);
+        } catch(e) {}
+      }
       var wrap = document.querySelector('.likes');
       if (!wrap) return;
       var NS = 'agicomics';
@@ -593,52 +1587,374 @@ def render_page_html2(cfg, comic, index, total, prev_slug, next_slug, image_url,
       var btn = wrap.querySelector('.like-btn');
       var cnt = wrap.querySelector('.like-count');
       btn.setAttribute('aria-pressed', 'false');
-      // Try Worker API first if configured; otherwise use CountAPI
-      var init = apiGet(slug);
-      if (init && typeof init.then === 'function'){{
-        init.then(function(v){{
-          if (typeof v === 'number') cnt.textContent = String(v);
-          else {{
-            countapiGet(NS, key).then(function(v2){{ if (typeof v2 === 'number') cnt.textContent = String(v2); else {{
-              countapiCreate(NS, key).then(function(v3){{ cnt.textContent = String(v3 || 0); }});
-            }} }});
-          }}
-        }});
-      }} else {{
-        countapiGet(NS, key).then(function(v){{
-          if (v === null) {{
-            return countapiCreate(NS, key).then(function(v2){{ cnt.textContent = String(v2 || 0); }});
-          }} else {{
-            cnt.textContent = String(v);
-          }}
-        }});
-      }}
-      btn.addEventListener('click', function(){{
+      var pending = 0, timer = null;
+      function show(v){ cnt.textContent = String(v); }
+      function loadCount(){
+        // Try Worker API first if configured; otherwise use CountAPI
+        var init = apiGet(slug);
+        if (init && typeof init.then === 'function'){
+          init.then(function(v){
+            if (typeof v === 'number') { show(v); cachePut(slug, v); }
+            else {
+              countapiGet(NS, key).then(function(v2){ if (typeof v2 === 'number') show(v2); else {
+                countapiCreate(NS, key).then(function(v3){ show(v3 || 0); });
+              } });
+            }
+          });
+        } else {
+          countapiGet(NS, key).then(function(v){
+            if (v === null) {
+              return countapiCreate(NS, key).then(function(v2){ show(v2 || 0); cachePut(slug, v2 || 0); });
+            } else {
+              show(v); cachePut(slug, v);
+            }
+          });
+        }
+      }
+      function loadLive(){
+        // One request for this comic and its stale neighbours, so the next swipe is instant
+        var want = [slug];
+        [navSlug('a.nav-btn.prev'), navSlug('a.nav-btn.next')].forEach(function(s){
+          if (s && want.indexOf(s) < 0 && !cacheFresh(cacheGet(s))) want.push(s);
+        });
+        var batch = apiBatch(want);
+        if (batch) {
+          batch.then(function(counts){
+            if (!counts || typeof counts[slug] !== 'number') return loadCount();
+            want.forEach(function(s){ if (typeof counts[s] === 'number') cachePut(s, counts[s]); });
+            show(counts[slug]);
+          });
+        } else {
+          loadCount();
+        }
+      }
+      var cached = cacheGet(slug);
+      if (cached) show(cached.c);
+      var snap = cacheFresh(cached) ? null : snapshotGet(slug);
+      if (snap) {
+        // The snapshot count is shown without asking the API (unless this browser has a newer, higher one)
+        snap.then(function(v){
+          if (typeof v !== 'number') return loadLive();
+          if (!(cached && cached.t > Date.now() - LIKES_TTL * 1000 && cached.c > v)) show(v);
+          if (!snapshotFresh(slug, v)) loadLive();
+        });
+      } else if (!cacheFresh(cached)) {
+        loadLive();
+      }
+      // Clicks within HIT_DEBOUNCE_MS of each other are sent as one hit
+      function flush(opts){
+        if (timer) { clearTimeout(timer); timer = null; }
+        var amount = Math.min(pending, HIT_AMOUNT_MAX);
+        pending -= amount;
+        if (!amount) return;
+        if (pending) timer = setTimeout(flush, HIT_DEBOUNCE_MS);
+        var inc = apiHit(slug, amount, opts);
+        if (!inc) inc = countapiUpdate(NS, key, amount, opts); // CountAPI fallback
+        inc.then(function(v){
+          if (typeof v === 'number') { if (!pending) show(v); cachePut(slug, v); }
+          else if (!likeApiBase()) countapiGet(NS, key).then(function(v2){ if (typeof v2 === 'number' && !pending) show(v2); });
+        });
+      }
+      btn.addEventListener('click', function(){
         // Immediate feedback: float +1 and optimistic increment
         showPlusOne(btn);
-        var cur = parseInt(cnt.textContent, 10) || 0;
-        cnt.textContent = String(cur + 1);
-        var inc = apiHit(slug);
-        if (inc && typeof inc.then === 'function'){{
-          inc.then(function(v){{
-            if (typeof v === 'number') cnt.textContent = String(v);
-            else countapiGet(NS, key).then(function(v2){{ if (typeof v2 === 'number') cnt.textContent = String(v2); }});
-          }});
-        }} else {{
-          // CountAPI fallback
-          countapiHit(NS, key).then(function(v){{
-            if (typeof v === 'number') cnt.textContent = String(v);
-            else countapiGet(NS, key).then(function(v2){{ if (typeof v2 === 'number') cnt.textContent = String(v2); }});
-          }});
-        }}
-      }});
-    }}
-    if (document.readyState === 'loading') {{
+        var cur = (parseInt(cnt.textContent, 10) || 0) + 1;
+        show(cur);
+        cachePut(slug, cur);
+        pending++;
+        if (timer) clearTimeout(timer);
+        timer = setTimeout(flush, HIT_DEBOUNCE_MS);
+      });
+      // Don't drop merged clicks when the reader swipes away first
+      window.addEventListener('pagehide', function(){ if (pending) flush({keepalive: true}); });
+    }
+    if (document.readyState === 'loading') {
       document.addEventListener('DOMContentLoaded', setupCountApiLikes);
-    }} else {{
+    } else {
       setupCountApiLikes();
-    }}
-  }})();</script>
+    }
+  })();
+(function(){try{var x=document.querySelector('.expl');if(!x) return; var c=x.querySelector('.content'); var b=x.querySelector('.exp-toggle');if(!c||!b) return; function needsToggle(){return c.scrollHeight>c.clientHeight+1;}function setOpen(v){ x.classList.toggle('open', v); b.setAttribute('aria-expanded', v?'true':'false'); b.textContent = (v?'Show less — ':'Show more — ') + (b.textContent.split(' — ').pop()||'Explanation'); }function init(){ if(!needsToggle()){ b.style.display='none'; } else { b.style.display='block'; } }b.addEventListener('click', function(){ setOpen(!x.classList.contains('open')); });setTimeout(init,0); window.addEventListener('resize', function(){ setTimeout(init,0); });}catch(e){}})();
+"""
+
+
+def render_site_js(cfg, path_prefix="/", search_index=None, likes_snapshot=None):
+    js = SITE_JS_TEMPLATE.replace("__LIKE_API_BASE__", json.dumps((cfg.get('likes_api_base') or '').strip()))
+    js = js.replace("__LIKES_TTL__", str(int(cfg.get("likes_ttl") or 0)))
+    js = js.replace("__LIKES_CACHE_TTL__", str(int(cfg.get("likes_cache_ttl") or 0)))
+    js = js.replace("__SEARCH_INDEX__", json.dumps(search_index or ""))
+    js = js.replace("__LIKES_SNAPSHOT__", json.dumps(f"{path_prefix}{likes_snapshot}" if likes_snapshot else ""))
+    return js.replace("__PATH_PREFIX__", json.dumps(path_prefix))
+
+
+def search_tokens(text):
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def write_search_index(writer, comics, include_descriptions=False, hashed_names=True):
+    """Write the prefix-sharded search index; returns the manifest's filename.
+
+    Shards map words to comic ids ({"terms": {word: [id]}, "docs": {id: [title, slug]}})
+    and are named by content hash under search/h/ so they can be cached forever
+    (hashed_names=False keeps plain search/<prefix>.json names for the preview
+    server). Alongside them a titles file lists every [title, slug] by id, so
+    the page script can still match inside words and by subsequence the way
+    the old flat index did. The manifest listing them keeps the stable name
+    search/index.json, so editing a title doesn't rename the site JS that
+    points at it and with it every page.
+    """
+    docs = [[c.get("title", ""), c.get("slug", "")] for c in comics]
+    postings = {}
+    for i, c in enumerate(comics):
+        words = search_tokens(c.get("title"))
+        if include_descriptions:
+            words += search_tokens(c.get("description"))
+        for w in dict.fromkeys(words):
+            postings.setdefault(w, []).append(i)
+
+    def split(prefix, tokens):
+        size = sum(len(postings[t]) for t in tokens)
+        if prefix and (size <= SEARCH_SHARD_MAX or len(prefix) >= SEARCH_PREFIX_MAX):
+            return [(prefix, tokens)]
+        groups = {}
+        for t in tokens:
+            groups.setdefault(t[:len(prefix) + 1], []).append(t)
+        out = []
+        for p in sorted(groups):
+            # Words no longer than the prefix can't be split further
+            out.extend([(p, groups[p])] if p == prefix else split(p, groups[p]))
+        return out
+
+    def dump(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+    shards = {}
+    for prefix, tokens in split("", sorted(postings)):
+        ids = sorted({i for t in tokens for i in postings[t]})
+        text = dump({"terms": {t: postings[t] for t in tokens}, "docs": {str(i): docs[i] for i in ids}})
+        name = f"search/h/{prefix}.{hashlib.sha256(text.encode('utf-8')).hexdigest()[:10]}.json" if hashed_names else f"search/{prefix}.json"
+        writer.write_text(name, text)
+        shards[prefix] = name
+    text = dump(docs)
+    titles = f"search/h/titles.{hashlib.sha256(text.encode('utf-8')).hexdigest()[:10]}.json" if hashed_names else "search/titles.json"
+    writer.write_text(titles, text)
+    writer.write_text(SEARCH_MANIFEST, dump({"v": 1, "n": len(docs), "shards": shards, "titles": titles, "browse": docs[:SEARCH_BROWSE_MAX]}))
+    return SEARCH_MANIFEST
+
+
+def _get_json(url, timeout=10):
+    import urllib.request
+    req = urllib.request.Request(url, headers={"User-Agent": "agicomics-build", "Accept": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as res:
+        return json.loads(res.read().decode("utf-8"))
+
+
+def fetch_likes_counts(base, slugs):
+    """Counts for slugs from a likes API: batched /likes?slugs= reads, or one request per slug
+    for Apps Script and for backends without the batch endpoint."""
+    base = base.rstrip("/")
+    if re.search(r"script\.google\.com/macros/s/", base):
+        one = lambda slug: f"{base}?action=likes&slug={quote(slug, safe='')}"
+    else:
+        one = lambda slug: f"{base}/likes?slug={quote(slug, safe='')}"
+        counts = {}
+        try:
+            for i in range(0, len(slugs), 100):
+                chunk = slugs[i:i + 100]
+                data = _get_json(f"{base}/likes?slugs=" + ",".join(quote(s, safe="") for s in chunk))
+                counts.update({s: int(data["counts"].get(s) or 0) for s in chunk})
+            return counts
+        except Exception:
+            pass  # older backend: fall back to per-slug reads
+    counts = {}
+    for slug in slugs:
+        data = _get_json(one(slug))
+        value = data.get("count", data.get("value")) if isinstance(data, dict) else None
+        counts[slug] = int(value or 0)
+    return counts
+
+
+def load_likes_counts(source, root, cfg, slugs):
+    """Like counts per slug from the configured snapshot source, or None when unavailable."""
+    try:
+        if source == "api":
+            base = (cfg.get("likes_api_base") or "").strip()
+            if not base:
+                print("WARNING: likes_snapshot is \"api\" but likes_api_base is not set", file=sys.stderr)
+                return None
+            return fetch_likes_counts(base, slugs)
+        path = source if os.path.isabs(source) else os.path.join(root, source)
+        if os.path.splitext(path)[1].lower() == ".json":
+            # {slug: n}, or a previous snapshot ({"counts": {slug: n}})
+            data = read_json(path)
+            stored = data.get("counts", data) if isinstance(data, dict) else {}
+        else:
+            # SQLite counters as kept by server/likes-server/likes_server.py
+            import sqlite3
+            conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+            try:
+                stored = dict(conn.execute("SELECT slug, count FROM likes"))
+            finally:
+                conn.close()
+        return {slug: int(stored.get(slug) or 0) for slug in slugs}
+    except Exception as e:
+        print(f"WARNING: Could not read likes snapshot from {source}: {e}", file=sys.stderr)
+        return None
+
+
+def write_likes_snapshot(writer, counts):
+    """Write the counts as likes-snapshot.json for the page script; returns its filename."""
+    writer.write_text(LIKES_SNAPSHOT, json.dumps({"counts": counts}, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+    return LIKES_SNAPSHOT
+
+
+def write_site_assets(writer, cfg, path_prefix="/", search_index=None, hashed_names=True, likes_snapshot=None):
+    """Write the shared CSS/JS under content-hashed names (plain ones with hashed_names=False); returns their filenames."""
+    assets = {}
+    for kind, text in (("css", SITE_CSS), ("js", render_site_js(cfg, path_prefix, search_index, likes_snapshot))):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:10]
+        name = f"site.{digest}.{kind}" if hashed_names else f"site.{kind}"
+        writer.write_text(name, text)
+        assets[kind] = name
+    return assets
+
+
+def img_attrs(width=None, height=None, placeholder=None):
+    """Extra attributes for the comic <img>: intrinsic size and the LQIP background."""
+    attrs = ""
+    try:
+        if width and height:
+            attrs = f" width=\"{int(width)}\" height=\"{int(height)}\""
+    except Exception:
+        attrs = ""
+    if placeholder:
+        attrs += f" class=\"lqip\" style=\"background-image:url({placeholder})\""
+    return attrs
+
+
+def render_page_html2(cfg, comic, index, total, prev_slug, next_slug, image_url, page_url, canonical_url, og_image_url, width=None, height=None, path_prefix="/", og_width=None, og_height=None, og_mime=None, updated_time_iso=None, assets=None, placeholder=None, oembed_url=None):
+    site_name = cfg["site_name"]
+    title = f"{site_name} — #{index}: {comic['title']}"
+    desc = comic.get("description") or cfg.get("description") or comic['title']
+    og_image = to_absolute(cfg["base_url"], og_image_url)
+    canonical = to_absolute(cfg["base_url"], canonical_url)
+
+
+    share_text = f"{comic['title']}"
+    share_url = canonical
+    x_url = f"https://twitter.com/intent/tweet?text={quote_plus(share_text)}&url={quote_plus(share_url)}"
+    bsky_url = f"https://bsky.app/intent/compose?text={quote_plus(share_text + ' ' + share_url)}"
+    reddit_url = f"https://www.reddit.com/submit?url={quote_plus(share_url)}&title={quote_plus(share_text)}"
+
+    direct_image_link = image_url
+    
+
+    # Shared stylesheet/script: linked as fingerprinted files when the build
+    # emits them (see write_site_assets), otherwise inlined into the page.
+    if assets:
+        style_block = f"<style>{CRITICAL_CSS}</style>\n  <link rel=\"stylesheet\" href=\"{path_prefix}{assets['css']}\">"
+        head_script = f"\n  <script src=\"{path_prefix}{assets['js']}\" defer></script>"
+        body_script = ""
+    else:
+        style_block = f"<style>{CRITICAL_CSS}{SITE_CSS}</style>"
+        head_script = ""
+        body_script = f"<script>{render_site_js(cfg, path_prefix)}</script>"
+
+    # Optional Twitter handle
+    twitter_site_tag = ""
+    if cfg.get("twitter_handle"):
+        twitter_site_tag = f'<meta name="twitter:site" content="{cfg.get("twitter_handle")}">'
+
+    # OG image extra tags
+    og_extras = []
+    if og_width:
+        og_extras.append(f'<meta property="og:image:width" content="{int(og_width)}">')
+    if og_height:
+        og_extras.append(f'<meta property="og:image:height" content="{int(og_height)}">')
+    if og_mime:
+        og_extras.append(f'<meta property="og:image:type" content="{og_mime}">')
+    og_extras_block = "\n  ".join(og_extras)
+
+    # Build description block with line clamp + toggle
+    explanation_html = ""
+    desc_val = (comic.get('description') or '').strip()
+    if desc_val:
+        expl_label2 = (cfg.get("explanation_label") or "Explanation").strip() or "Explanation"
+        explanation_html = (
+            f'<div class="expl">'
+            f'<div class="content">{comic.get("description","")}</div>'
+            f'<button class="exp-toggle" type="button" aria-expanded="false">Show more — {expl_label2}</button>'
+            f'</div>'
+        )
+
+    size_attrs = img_attrs(width, height, placeholder)
+
+    # Optional oEmbed discovery link (JSON): the static document if the build
+    # wrote one, otherwise the configured endpoint
+    oembed_tag = ""
+    if oembed_url or cfg.get("oembed_endpoint"):
+        disc_href = to_absolute(cfg["base_url"], oembed_url) if oembed_url else f"{cfg['oembed_endpoint']}?url={quote_plus(canonical)}"
+        oembed_tag = f"<link rel=\"alternate\" type=\"application/json+oembed\" href=\"{disc_href}\" title=\"{site_name}\">"
+
+    # Optional host normalization: redirect to a preferred host if configured
+    preferred_host = (cfg.get("preferred_host") or "").strip()
+    host_redirect_script = ""
+    if preferred_host:
+        host_redirect_script = (
+            "<script>(function(){try{"
+            "var PH='" + preferred_host + "';"
+            "var h=location.hostname||'';"
+            "if(h && h!==PH && h!=='localhost' && h!=='127.0.0.1'){"
+            "  var proto=(location.protocol||'https:');"
+            "  var url=proto+'//'+PH+location.pathname+location.search+location.hash;"
+            "  if (location.href!==url) location.replace(url);"
+            "}"
+            "}catch(e){}})();</script>"
+        )
+
+    # Prepare JSON-LD (WebPage + primary image)
+    try:
+        ld_image = {"@type": "ImageObject", "url": og_image}
+        if og_width and og_height:
+            ld_image["width"] = int(og_width)
+            ld_image["height"] = int(og_height)
+        ld = {
+            "@context": "https://schema.org",
+            "@type": "WebPage",
+            "headline": title,
+            "url": canonical,
+            "image": ld_image,
+            "description": desc,
+        }
+        if (cfg.get("author") or "").strip():
+            ld["author"] = {"@type": "Person", "name": (cfg.get("author") or "").strip()}
+        json_ld_block = json.dumps(ld, ensure_ascii=False)
+    except Exception:
+        json_ld_block = "{}"
+
+    html = f"""<!doctype html>
+<html lang=\"en\">\n<head>\n  <meta charset=\"utf-8\">\n  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n  <title>{title}</title>
+  <meta name=\"description\" content=\"{desc}\">\n  <link rel=\"canonical\" href=\"{canonical}\">\n  <meta property=\"og:type\" content=\"website\">\n  <meta property=\"og:title\" content=\"{title}\">\n  <meta property=\"og:description\" content=\"{desc}\">\n  <meta property=\"og:image\" content=\"{og_image}\">\n  <meta property=\"og:image:secure_url\" content=\"{og_image}\">\n  <meta property=\"og:url\" content=\"{canonical}\">\n  <meta property=\"og:site_name\" content=\"{site_name}\">\n  {og_extras_block}\n  <meta property=\"og:updated_time\" content=\"{updated_time_iso}\">\n  <meta name=\"twitter:card\" content=\"summary_large_image\">\n  <meta name=\"twitter:title\" content=\"{title}\">\n  <meta name=\"twitter:description\" content=\"{desc}\">\n  <meta name=\"twitter:image\" content=\"{og_image}\">\n  <meta name=\"twitter:image:alt\" content=\"{comic['title']}\">\n  {twitter_site_tag}{style_block}\n  <script src=\"{path_prefix}swipe.js\" defer></script>{head_script}
+  {host_redirect_script}
+</head>
+<body>
+  <header>
+    <div class=\"title\">{site_name}</div>
+    <div class=\"search\">\n      <div class=\"box\">\n        <input id=\"q\" type=\"search\" placeholder=\"Search comics...\" autocomplete=\"off\" aria-label=\"Search comics\"/>\n        <div class=\"dd\" role=\"listbox\" aria-label=\"Search suggestions\"></div>\n      </div>\n    </div>
+  </header>
+  <main>
+    <div class=\"comic\">\n      <div class=\"img-wrap\">\n        <a class=\"nav-btn prev\" href=\"{path_prefix}c/{prev_slug}/\" aria-label=\"Previous comic\">&#8592;</a>\n        <a class=\"nav-btn next\" href=\"{path_prefix}c/{next_slug}/\" aria-label=\"Next comic\">&#8594;</a>\n        <img src=\"{image_url}\" alt=\"{comic['title']}\" loading=\"eager\"{size_attrs}>\n      </div>\n      <div class=\"desc\"><strong>{comic['title']}</strong></div>\n      <div class=\"likes\" data-slug=\"{comic['slug']}\"><button class=\"like-btn\" type=\"button\" aria-pressed=\"false\" aria-label=\"Like this comic\"><span class=\"heart\" aria-hidden=\"true\">❤</span></button> <span class=\"like-count\" aria-live=\"polite\">0</span></div>\n      {explanation_html}
+      <div class=\"meta\"><a href=\"{direct_image_link}\">Direct image link</a> • <a href=\"{canonical_url}\">Permalink</a></div>
+      <div class=\"share\">\n+        <span class=\"label\">share on</span>
+        <a href=\"{x_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on X\" title=\"Share on X\"><svg viewBox=\"0 0 24 24\" fill=\"none\" stroke=\"currentColor\" stroke-width=\"2\" stroke-linecap=\"round\" stroke-linejoin=\"round\"><path d=\"M4 4l16 16M20 4L4 20\"/></svg></a>
+        <a href=\"{bsky_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on Bluesky\" title=\"Share on Bluesky\"><svg viewBox=\"0 0 24 24\" fill=\"currentColor\"><path d=\"M6 7c1.5 1.8 3.8 3 6 6 2.2-3 4.5-4.2 6-6-1 3-2.5 5-6 8-3.5-3-5-5-6-8z\"/></svg></a>
+        <a href=\"{reddit_url}\" target=\"_blank\" rel=\"noopener noreferrer\" aria-label=\"Share on Reddit\" title=\"Share on Reddit\"><svg viewBox=\"0 0 24 24\" fill=\"none\" stroke=\"currentColor\" stroke-width=\"1.5\"><circle cx=\"12\" cy=\"13\" r=\"7\"/><circle cx=\"9\" cy=\"12\" r=\"1\" fill=\"currentColor\"/><circle cx=\"15\" cy=\"12\" r=\"1\" fill=\"currentColor\"/><path d=\"M9 15c1.5 1 4.5 1 6 0\"/></svg></a>
+      </div>
+      <div class=\"copyright\">© <a href=\"https://www.dileeplearning.com\" target=\"_blank\" rel=\"noopener noreferrer\">Dileep George</a> • <a href=\"https://blog.dileeplearning.com\" target=\"_blank\" rel=\"noopener noreferrer\">AGI blog</a></div>
+    </div>
+  </main>
+  
+  {body_script}
 </body>
     </html>"""
     if oembed_tag:
@@ -651,22 +1967,110 @@ def render_page_html2(cfg, comic, index, total, prev_slug, next_slug, image_url,
         html = html.replace("</head>", f"  <script type=\"application/ld+json\">{json_ld_block}</script>\n</head>", 1)
     except Exception:
         pass
-    # Add a tiny script to toggle description expansion and hide the button if not needed
+    return html
+
+
+def render_oembed(cfg, comic, canonical_url, image_url, width=None, height=None):
+    """Static oEmbed (type "photo") document for one comic, as the Worker's /oembed returns it."""
+    doc = {
+        "version": "1.0",
+        "type": "photo",
+        "provider_name": cfg["site_name"],
+        "provider_url": to_absolute(cfg["base_url"], cfg.get("base_path") or "/"),
+        "title": comic["title"],
+        "url": to_absolute(cfg["base_url"], image_url),
+    }
+    if width and height:
+        doc["width"], doc["height"] = int(width), int(height)
+    doc["author_url"] = to_absolute(cfg["base_url"], canonical_url)
+    if (cfg.get("author") or "").strip():
+        doc["author_name"] = cfg["author"].strip()
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def render_headers_file(cfg, path_prefix, assets):
+    """_headers cache policy (Netlify / Cloudflare Pages format).
+
+    Fingerprinted files never change under the same name, so they are cached
+    for a year; HTML pages are kept short-lived so new comics show up quickly.
+    """
+    immutable = "public, max-age=31536000, immutable"
+    html = f"public, max-age={int(cfg.get('html_max_age') or 0)}, must-revalidate"
+    rules = [(f"{path_prefix}{assets[k]}", immutable) for k in sorted(assets)]
+    rules += [(f"{path_prefix}{d}/*", immutable) for d in ("images/h", "images/share", "search/h")]
+    rules += [(f"{path_prefix}{p}", html) for p in ("", "index.html", "c/*", "oembed/*", SEARCH_MANIFEST, LIKES_SNAPSHOT, "404.html")]
+    return "".join(f"{path}\n  Cache-Control: {value}\n" for path, value in rules)
+
+
+def render_redirect_stub(cfg, title, target_url):
+    """Minimal page for numeric/alias URLs: canonical link + meta refresh to the slug page."""
+    canonical = to_absolute(cfg["base_url"], target_url)
+    return (
+        "<!doctype html>\n<html lang=\"en\"><head><meta charset=\"utf-8\">"
+        f"<title>{title}</title>"
+        f"<link rel=\"canonical\" href=\"{canonical}\">"
+        f"<meta http-equiv=\"refresh\" content=\"0; url={target_url}\">"
+        f"<script>location.replace(\"{target_url}\"+location.search+location.hash)</script>"
+        f"</head><body><a href=\"{target_url}\">{title}</a></body></html>\n"
+    )
+
+
+def sitemap_history_path(root):
+    return os.path.join(root, ".cache", "sitemap-lastmod.json")
+
+
+def update_sitemap_history(path, content_hashes, now_iso):
+    """lastmod per slug: kept while the comic's content hash is unchanged, else now_iso."""
     try:
-        toggle_js = (
-            "<script>(function(){try{var x=document.querySelector('.expl');"
-            "if(!x) return; var c=x.querySelector('.content'); var b=x.querySelector('.exp-toggle');"
-            "if(!c||!b) return; function needsToggle(){return c.scrollHeight>c.clientHeight+1;}"
-            "function setOpen(v){ x.classList.toggle('open', v); b.setAttribute('aria-expanded', v?'true':'false'); b.textContent = (v?'Show less — ':'Show more — ') + (b.textContent.split(' — ').pop()||'Explanation'); }"
-            "function init(){ if(!needsToggle()){ b.style.display='none'; } else { b.style.display='block'; } }"
-            "b.addEventListener('click', function(){ setOpen(!x.classList.contains('open')); });"
-            "setTimeout(init,0); window.addEventListener('resize', function(){ setTimeout(init,0); });"
-            "}catch(e){}})();</script>"
-        )
-        html = html.replace("</body>", toggle_js + "\n</body>")
+        prev = read_json(path)
+        if not isinstance(prev, dict):
+            prev = {}
     except Exception:
-        pass
-    return html
+        prev = {}
+    history = {}
+    for slug, digest in content_hashes.items():
+        old = prev.get(slug)
+        history[slug] = old if isinstance(old, list) and len(old) == 2 and old[0] == digest else [digest, now_iso]
+    if history != prev:
+        try:
+            ensure_dir(os.path.dirname(path))
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(history, f, separators=(",", ":"))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"WARNING: could not write {path}: {e}", file=sys.stderr)
+    return {slug: v[1] for slug, v in history.items()}
+
+
+def render_sitemap(entries):
+    """<urlset> for (loc, lastmod, image_locs) entries, with image sitemap extensions."""
+    out = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+           '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+           'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n']
+    for loc, lastmod, images in entries:
+        out.append(f"  <url><loc>{xml_escape(loc)}</loc><lastmod>{lastmod}</lastmod>")
+        out.extend(f"<image:image><image:loc>{xml_escape(img)}</image:loc></image:image>" for img in images)
+        out.append("</url>\n")
+    out.append("</urlset>\n")
+    return "".join(out)
+
+
+def write_sitemaps(writer, cfg, path_prefix, entries):
+    """Write sitemap.xml (a sitemap index over sitemaps/*.xml for large catalogs); returns its URL."""
+    if len(entries) <= SITEMAP_SHARD_MAX:
+        writer.write_text("sitemap.xml", render_sitemap(entries))
+    else:
+        out = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+        for n, start in enumerate(range(0, len(entries), SITEMAP_SHARD_MAX), start=1):
+            shard = entries[start:start + SITEMAP_SHARD_MAX]
+            rel = f"sitemaps/sitemap-{n}.xml"
+            writer.write_text(rel, render_sitemap(shard))
+            loc = to_absolute(cfg["base_url"], f"{path_prefix}{rel}")
+            out.append(f"  <sitemap><loc>{xml_escape(loc)}</loc><lastmod>{max(e[1] for e in shard)}</lastmod></sitemap>\n")
+        out.append("</sitemapindex>\n")
+        writer.write_text("sitemap.xml", "".join(out))
+    return to_absolute(cfg["base_url"], f"{path_prefix}sitemap.xml")
 
 
 def swap_brand_icons(html: str, avail: dict, path_prefix: str = "/") -> str:
@@ -686,151 +2090,75 @@ def swap_brand_icons(html: str, avail: dict, path_prefix: str = "/") -> str:
     html = html.replace('\n+        <span class="label"', '\n        <span class="label"')
     return html
 
-def main():
-    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    comics_path = os.path.join(root, "comics.json")
-    comics_dir = os.path.join(root, "comics")
-    out_dir = os.path.join(root, "public")
-
-    if not os.path.exists(comics_path):
-        print("ERROR: comics.json not found. Run scripts/generate_comics_json.py first.", file=sys.stderr)
-        sys.exit(1)
-
-    data = read_json(comics_path)
-    comics = data.get("comics", [])
-    # Filter out comics marked invisible
-    comics = [c for c in comics if not (isinstance(c.get('visible'), bool) and c.get('visible') is False)]
-    # Optional ordering: if an integer field 'order' exists, sort ascending by it.
-    # Comics without 'order' keep their original relative order and appear after those with an order.
-    def _sort_key(item_with_index):
-        idx, c = item_with_index
-        v = c.get('order')
-        try:
-            val = int(v)
-        except Exception:
-            val = None
-        # Items with no valid order go after ordered ones (use a large sentinel),
-        # and preserve original order via the original index as tiebreaker.
-        return (val if val is not None else 10_000_000, idx)
-
-    comics = [c for _, c in sorted(list(enumerate(comics)), key=_sort_key)]
-    if not comics:
-        print("ERROR: No comics in comics.json", file=sys.stderr)
-        sys.exit(1)
-
-    cfg = load_site_config(root)
-
-    # Prepare output directories (clean to avoid stale pages with old meta)
-    ensure_dir(out_dir)
-    clean_dir(out_dir)
-    images_out = os.path.join(out_dir, "images")
-    ensure_dir(images_out)
-    share_out = os.path.join(images_out, "share")
-    ensure_dir(share_out)
-
-    # Optional optimization: create webp alongside originals if Pillow is available
-    try:
-        from PIL import Image  # type: ignore
-        have_pillow = True
-    except Exception:
-        have_pillow = False
-
-    # Copy images under slug.ext for stable URLs
-    for c in comics:
-        src = os.path.join(comics_dir, c["file"])
-        if not os.path.isfile(src):
-            print(f"WARNING: Missing file {src}, skipping copy", file=sys.stderr)
-            continue
-        dest_name = f"{c['slug']}{c['ext']}"
-        dest = os.path.join(images_out, dest_name)
-        # Copy if changed or not exists
-        if not os.path.exists(dest) or os.path.getmtime(dest) < os.path.getmtime(src):
-            shutil.copy2(src, dest)
-        if have_pillow:
-            try:
-                img = Image.open(src)
-                # Generate responsive WebP variants (widths: 640, 980, 1960)
-                try:
-                    from PIL import Image as _Image
-                    LANCZOS = getattr(_Image, 'LANCZOS', getattr(_Image, 'Resampling', None).LANCZOS if hasattr(getattr(_Image, 'Resampling', None), 'LANCZOS') else _Image.BICUBIC)
-                except Exception:
-                    LANCZOS = None
-                base_rgb = img.convert("RGBA" if img.mode in ("RGBA", "LA") else "RGB")
-                orig_w, orig_h = base_rgb.size
-                for target_w in (640, 980, 1960):
-                    if not orig_w or target_w > orig_w:
-                        # Skip upscaling beyond original width
-                        continue
-                    scale = target_w / float(orig_w)
-                    target_h = max(1, int(round(orig_h * scale)))
-                    resized = base_rgb.resize((target_w, target_h), LANCZOS) if LANCZOS else base_rgb
-                    webp_dest = os.path.join(images_out, f"{c['slug']}-{target_w}.webp")
-                    q = int(os.environ.get('WEBP_QUALITY', '80'))
-                    save_kwargs = {"optimize": True, "quality": q, "method": 5}
-                    try:
-                        resized.save(webp_dest, format="WEBP", **save_kwargs)
-                    except Exception:
-                        pass
-                # Generate 1200x630 JPG share image (letterboxed to fit)
-                try:
-                    SHARE_W, SHARE_H = 1200, 630
-                    bg = (11, 15, 26)  # dark background to match site
-                    base2 = img.convert("RGB")
-                    # Preserve aspect ratio: fit within box
-                    import math
-                    w, h = base2.size
-                    if w and h:
-                        scale = min(SHARE_W / float(w), SHARE_H / float(h))
-                        new_w = max(1, int(round(w * scale)))
-                        new_h = max(1, int(round(h * scale)))
-                    else:
-                        new_w, new_h = SHARE_W, SHARE_H
-                    if LANCZOS is not None:
-                        resized = base2.resize((new_w, new_h), LANCZOS)
-                    else:
-                        resized = base2.resize((new_w, new_h))
-                    canvas = Image.new('RGB', (SHARE_W, SHARE_H), bg)
-                    off_x = (SHARE_W - new_w) // 2
-                    off_y = (SHARE_H - new_h) // 2
-                    canvas.paste(resized, (off_x, off_y))
-                    share_dest = os.path.join(share_out, f"{c['slug']}-1200x630.jpg")
-                    canvas.save(share_dest, format='JPEG', quality=85, optimize=True, progressive=True)
-                except Exception as e:
-                    print(f"NOTE: Could not generate 1200x630 share image for {src}: {e}", file=sys.stderr)
-            except Exception as e:
-                print(f"NOTE: Could not generate webp for {src}: {e}", file=sys.stderr)
-
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static comic site into public/.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for image processing (default: CPU count)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep public/ and only rewrite outputs whose inputs changed")
+    parser.add_argument("--pages-only", action="store_true",
+                        help="skip image encoding; render pages from the recorded image metadata and "
+                             "cached derivatives (works without Pillow)")
+    parser.add_argument("--profile", nargs="?", const=".cache/build-trace.json", default=None, metavar="TRACE",
+                        help="record per-stage/per-comic timings; writes a Chrome trace JSON "
+                             "(default: .cache/build-trace.json) and prints a summary")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="number of slowest comics listed in the profile summary")
+    args = parser.parse_args(argv)
+    args.jobs = max(1, args.jobs)
+    return args
+
+
+def homepage_slug(cfg, comics):
+    """The homepage mirrors a chosen slug if provided, otherwise the latest comic."""
+    chosen = (cfg.get('homepage_slug') or '').strip() if isinstance(cfg.get('homepage_slug'), str) else None
+    return chosen if any(c.get('slug') == chosen for c in comics) else comics[-1]['slug']
+
+
+def render_site(writer, root, cfg, comics, image_meta, prof=None, hashed_names=True, only=None):
+    """Write everything except the images: icons, search, shared assets, comic pages and site files.
+
+    Pages are rendered from image_meta alone. With `only` (a set of slugs),
+    comics outside it keep the outputs the writer already has for them, which
+    is how scripts/serve.py re-renders just an edited comic and its neighbours.
+    """
+    prof = prof or BuildProfiler()
     total = len(comics)
+    sp = prof.begin("stage.static")
+    static_bytes = writer.bytes_written
 
     # Prepare icons before generating pages so replacements know availability
     icons_src = os.path.join(root, 'assets', 'icons')
-    icons_out = os.path.join(out_dir, 'icons')
-    ensure_dir(icons_out)
     available_icons = {}
     if os.path.isdir(icons_src):
         for name in os.listdir(icons_src):
             if name.lower().endswith('.svg'):
                 try:
-                    shutil.copy2(os.path.join(icons_src, name), os.path.join(icons_out, name))
+                    writer.copy_file(os.path.join(icons_src, name), f"icons/{name}")
                     available_icons[os.path.splitext(name)[0].lower()] = True
                 except Exception:
                     pass
 
-    # Generate a lightweight search index (title + slug) for client-side autocomplete
-    try:
-        search_index = [{"t": c.get("title", ""), "s": c.get("slug", "")} for c in comics]
-        with open(os.path.join(out_dir, "search-index.json"), "w", encoding="utf-8") as f:
-            json.dump(search_index, f, ensure_ascii=False)
-    except Exception:
-        pass
-
-    # Generate a lightweight search index (title + slug) for client-side autocomplete
+    # Sharded search index for client-side autocomplete
     try:
-        search_index = [{"t": c.get("title", ""), "s": c.get("slug", "")} for c in comics]
-        with open(os.path.join(out_dir, "search-index.json"), "w", encoding="utf-8") as f:
-            json.dump(search_index, f, ensure_ascii=False)
-    except Exception:
-        pass
+        search_index = write_search_index(writer, comics, cfg.get("search_descriptions"), hashed_names)
+    except Exception as e:
+        print(f"WARNING: Could not write search index: {e}", file=sys.stderr)
+        search_index = None
+
+    # Optional likes snapshot: counts read by the page script on load, so the
+    # first paint needs no request to the likes API. site.js points at it
+    # whenever the stage is configured, so a failed fetch doesn't rename it.
+    likes_snapshot = None
+    if cfg.get("likes_snapshot"):
+        likes_snapshot = LIKES_SNAPSHOT
+        likes_counts = load_likes_counts(cfg["likes_snapshot"], root, cfg, [c["slug"] for c in comics])
+        if likes_counts is not None:
+            write_likes_snapshot(writer, likes_counts)
+            print(f"Likes snapshot: {sum(likes_counts.values())} likes across {len(likes_counts)} comics ({LIKES_SNAPSHOT})")
+        elif LIKES_SNAPSHOT in writer.prev and writer.fresh(LIKES_SNAPSHOT, writer.prev[LIKES_SNAPSHOT]):
+            # Keep the last counts rather than dropping the file site.js reads
+            writer.keep(LIKES_SNAPSHOT, writer.prev[LIKES_SNAPSHOT])
 
     # Write a small swipe.js to support mobile swipe left/right navigation
     try:
@@ -844,133 +2172,125 @@ def main():
             "  document.addEventListener('touchcancel', function(){ tracking=false; }, { passive:true });\n"
             "})();\n"
         )
-        with open(os.path.join(out_dir, "swipe.js"), "w", encoding="utf-8") as f:
-            f.write(swipe_js)
+        writer.write_text("swipe.js", swipe_js)
     except Exception:
         pass
 
-    # Determine build version for cache-busting of OG assets
-    def _compute_build_version():
-        v = os.environ.get('BUILD_VERSION')
-        if v:
-            return v
-        try:
-            v = subprocess.check_output(['git','rev-parse','--short','HEAD'], cwd=root).decode('utf-8').strip()
-            if v:
-                return v
-        except Exception:
-            pass
-        try:
-            return str(int(time.time()))
-        except Exception:
-            return None
+    # Shared CSS/JS as fingerprinted files, so pages only carry critical CSS
+    assets = write_site_assets(writer, cfg, cfg.get('base_path', '/'), search_index, hashed_names, likes_snapshot)
+    prof.end(sp, writer.bytes_written - static_bytes)
 
-    build_version = _compute_build_version()
     updated_time_iso = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
 
     # Generate per-index pages and slug permalinks
-    latest_index = total
-    latest_html = None
-    homepage_slug = (cfg.get('homepage_slug') or '').strip() if isinstance(cfg.get('homepage_slug'), str) else None
-    homepage_html = None
+    home_slug = homepage_slug(cfg, comics)
     path_prefix = cfg.get('base_path', '/')
+    redirect_stubs = (cfg.get('alias_pages') or 'full') == 'redirect'
+    redirects = []
+    # Any change to this script (templates, CSS, JS) invalidates every page
+    template_version = file_sha256(os.path.abspath(__file__))
+    pages_sp = prof.begin("stage.pages")
+    pages_bytes = writer.bytes_written
+    # Per canonical slug URL: hash of what the comic shows, for sitemap lastmod
+    content_hashes = {}
+    sitemap_images = {}
     for i, c in enumerate(comics, start=1):
         prev_index = total if i == 1 else i - 1
         next_index = 1 if i == total else i + 1
         prev_slug = comics[prev_index - 1]["slug"]
         next_slug = comics[next_index - 1]["slug"]
+        info = image_meta.get(c['slug']) or {}
+
+        aliases = []
+        try:
+            v_alias = c.get('aliases')
+            if isinstance(v_alias, list):
+                aliases = [str(a).strip() for a in v_alias if isinstance(a, (str,)) and str(a).strip()]
+        except Exception:
+            aliases = []
+        slug_page_rel = f"{path_prefix}c/{c['slug']}/"
+        redirects.append((f"{path_prefix}{i}/", slug_page_rel))
+        redirects.extend((f"{path_prefix}c/{a}/", slug_page_rel) for a in aliases)
+        if cfg.get('sitemap'):
+            content_hashes[c['slug']] = fingerprint({"comic": c, "image": info.get("src_hash")})
+            largest_webp = max((info.get("variants") or {}).get("webp", {}).values(), key=lambda v: v["width"], default=None)
+            sitemap_images[c['slug']] = [f"{path_prefix}images/{v['file']}" for v in (info.get("share"), largest_webp) if v]
+
+        page_outputs = [f"{i}/index.html", f"c/{c['slug']}/index.html"] + [f"c/{a}/index.html" for a in aliases]
+        if c['slug'] == home_slug:
+            page_outputs.append("index.html")
+        oembed_outputs = [f"oembed/{s}.json" for s in [c['slug']] + aliases] if cfg.get('oembed_files') else []
+        page_outputs += oembed_outputs
+        # Partial rebuilds (scripts/serve.py) carry other comics' pages over untouched
+        if only is not None and c['slug'] not in only and all(rel in writer.prev for rel in page_outputs):
+            for rel in page_outputs:
+                writer.keep(rel, writer.prev[rel])
+            continue
+
+        # Everything the comic's pages are rendered from. The build timestamp is
+        # left out on purpose: incremental builds keep the old og:updated_time
+        # for pages whose content did not change.
+        page_fp = fingerprint({
+            "template": template_version,
+            "cfg": cfg,
+            "icons": available_icons,
+            "comic": c,
+            "index": i,
+            "prev": prev_slug,
+            "next": next_slug,
+            "image": info,
+            "assets": assets,
+        })
+        if all(writer.fresh(rel, page_fp) for rel in page_outputs):
+            for rel in page_outputs:
+                writer.keep(rel, page_fp)
+            continue
 
-        original_image_rel = f"{path_prefix}images/{c['slug']}{c['ext']}"
-        # Build list of available WebP variants
-        webp_variants = []
-        for wv in (640, 980, 1960):
-            p = os.path.join(images_out, f"{c['slug']}-{wv}.webp")
-            if os.path.exists(p):
-                webp_variants.append((wv, f"{path_prefix}images/{c['slug']}-{wv}.webp"))
+        # Pages reference the fingerprinted copies (see process_comic_images)
+        original_image_rel = f"{path_prefix}images/{info.get('original') or c['slug'] + c['ext']}"
+        # Build list of available WebP/AVIF variants, narrowest first
+        variants = info.get("variants") or {}
+        webp_variants = [(v["width"], f"{path_prefix}images/{v['file']}")
+                         for v in sorted((variants.get("webp") or {}).values(), key=lambda v: v["width"])]
+        avif_variants = [(v["width"], f"{path_prefix}images/{v['file']}")
+                         for v in sorted((variants.get("avif") or {}).values(), key=lambda v: v["width"])]
         prefer_webp = bool(cfg.get('prefer_webp'))
         # Default display: 980w webp if available, else fallback to original
         default_webp = next((u for (w,u) in webp_variants if w == 980), None)
         image_rel = default_webp if (prefer_webp and default_webp) else original_image_rel
         # Prefer generated share image for OG cards if available
-        share_rel = f"{path_prefix}images/share/{c['slug']}-1200x630.jpg"
-        share_abs = os.path.join(images_out, 'share', f"{c['slug']}-1200x630.jpg")
-        og_image_rel = share_rel if os.path.exists(share_abs) else original_image_rel
+        share = info.get("share")
+        has_share = bool(share)
+        share_rel = f"{path_prefix}images/{share['file']}" if share else None
+        og_image_rel = share_rel if has_share else original_image_rel
 
-        width = height = None
-        try:
-            from PIL import Image  # type: ignore
-            with Image.open(os.path.join(images_out, f"{c['slug']}{c['ext']}")) as im:
-                width, height = im.size
-        except Exception:
-            pass
-
-        numeric_page_rel = f"{path_prefix}{i}/"
-        slug_page_rel = f"{path_prefix}c/{c['slug']}/"
+        width, height = info.get("width"), info.get("height")
 
         # Determine OG image dimensions and mime type (prefer share image if present)
         og_width = og_height = None
         og_mime = None
-        try:
-            if os.path.exists(share_abs):
-                og_width, og_height = (1200, 630)
-                og_mime = 'image/jpeg'
-            else:
-                ext = (c.get('ext') or '').lower()
-                og_mime = 'image/jpeg' if ext in ('.jpg', '.jpeg') else 'image/png' if ext == '.png' else 'image/webp' if ext == '.webp' else None
-                orig_path = os.path.join(images_out, f"{c['slug']}{c['ext']}")
-                from PIL import Image  # type: ignore
-                with Image.open(orig_path) as im:
-                    og_width, og_height = im.size
-        except Exception:
-            pass
+        if has_share:
+            og_width, og_height = share["width"], share["height"]
+            og_mime = 'image/jpeg'
+        else:
+            ext = (c.get('ext') or '').lower()
+            og_mime = info.get("mime") or ('image/jpeg' if ext in ('.jpg', '.jpeg') else 'image/png' if ext == '.png' else 'image/webp' if ext == '.webp' else None)
+            og_width, og_height = width, height
 
-        # Numeric page that canonicals to slug
-        # Build WebP srcset for <picture>
+        # Build AVIF/WebP srcsets for <picture>; AVIF goes first so browsers
+        # that support it pick it over WebP
         srcset_webp = ""
+        srcset_avif = ""
         sizes_attr = "(max-width: 980px) 100vw, 980px"
         if prefer_webp and webp_variants:
             srcset_webp = ", ".join([f"{u} {w}w" for (w,u) in webp_variants])
+        if prefer_webp and avif_variants:
+            srcset_avif = ", ".join(f"{u} {w}w" for (w, u) in avif_variants)
 
-        html_numeric = render_page_html2(
-            cfg, c, i, total, prev_slug, next_slug,
-            image_url=image_rel,
-            page_url=numeric_page_rel,
-            canonical_url=slug_page_rel,
-            og_image_url=og_image_rel,
-            width=width,
-            height=height,
-            og_width=og_width,
-            og_height=og_height,
-            og_mime=og_mime,
-            path_prefix=path_prefix,
-            build_version=build_version,
-            updated_time_iso=updated_time_iso,
-        )
-        if srcset_webp:
-            size_attrs_str = ""
-            try:
-                if width and height:
-                    size_attrs_str = f" width=\"{int(width)}\" height=\"{int(height)}\""
-            except Exception:
-                size_attrs_str = ""
-            html_numeric = html_numeric.replace(
-                f"<img src=\"{image_rel}\" alt=\"{c['title']}\" loading=\"eager\"{size_attrs_str}>",
-                (
-                    f"<picture>\n"
-                    f"  <source type=\"image/webp\" srcset=\"{srcset_webp}\" sizes=\"{sizes_attr}\">\n"
-                    f"  <img src=\"{original_image_rel}\" alt=\"{c['title']}\" loading=\"eager\"{size_attrs_str}>\n"
-                    f"</picture>"
-                ),
-                1,
-            )
-        html_numeric = swap_brand_icons(html_numeric, available_icons, path_prefix)
-        page_dir = os.path.join(out_dir, str(i))
-        ensure_dir(page_dir)
-        with open(os.path.join(page_dir, "index.html"), "w", encoding="utf-8") as f:
-            f.write(html_numeric)
-
-        # Slug permalink page
-        html_slug = render_page_html2(
+        # Render the comic once; the numeric, slug, alias and home pages are
+        # identical copies, all canonical to the slug URL.
+        sp = prof.begin("pages.render", c['slug'])
+        html = render_page_html2(
             cfg, c, i, total, prev_slug, next_slug,
             image_url=image_rel,
             page_url=slug_page_rel,
@@ -982,106 +2302,203 @@ def main():
             og_height=og_height,
             og_mime=og_mime,
             path_prefix=path_prefix,
-            build_version=build_version,
             updated_time_iso=updated_time_iso,
+            assets=assets,
+            placeholder=info.get("lqip"),
+            oembed_url=f"{path_prefix}oembed/{c['slug']}.json" if oembed_outputs else None,
         )
-        if srcset_webp:
-            size_attrs_str = ""
-            try:
-                if width and height:
-                    size_attrs_str = f" width=\"{int(width)}\" height=\"{int(height)}\""
-            except Exception:
-                size_attrs_str = ""
-            html_slug = html_slug.replace(
+        prof.end(sp)
+        sp = prof.begin("pages.picture", c['slug'])
+        if srcset_webp or srcset_avif:
+            size_attrs_str = img_attrs(width, height, info.get("lqip"))
+            html = html.replace(
                 f"<img src=\"{image_rel}\" alt=\"{c['title']}\" loading=\"eager\"{size_attrs_str}>",
                 (
                     f"<picture>\n"
-                    f"  <source type=\"image/webp\" srcset=\"{srcset_webp}\" sizes=\"{sizes_attr}\">\n"
-                    f"  <img src=\"{original_image_rel}\" alt=\"{c['title']}\" loading=\"eager\"{size_attrs_str}>\n"
+                    + "".join(
+                        f"  <source type=\"{mime}\" srcset=\"{srcset}\" sizes=\"{sizes_attr}\">\n"
+                        for mime, srcset in (("image/avif", srcset_avif), ("image/webp", srcset_webp)) if srcset
+                    )
+                    + f"  <img src=\"{original_image_rel}\" alt=\"{c['title']}\" loading=\"eager\"{size_attrs_str}>\n"
                     f"</picture>"
                 ),
                 1,
             )
-        html_slug = swap_brand_icons(html_slug, available_icons, path_prefix)
-        slug_dir = os.path.join(out_dir, "c", c["slug"])
-        ensure_dir(slug_dir)
-        with open(os.path.join(slug_dir, "index.html"), "w", encoding="utf-8") as f:
-            f.write(html_slug)
+        prof.end(sp)
+        with prof.span("pages.icons", c['slug']):
+            html = swap_brand_icons(html, available_icons, path_prefix)
+
+        variants = [f"c/{c['slug']}/index.html"]
+        if c['slug'] == home_slug:
+            variants.append("index.html")
+        # Numeric page and optional alias slug pages that canonical to the main slug
+        secondary = [f"{i}/index.html"] + [f"c/{alias}/index.html" for alias in aliases]
+        sp = prof.begin("pages.write", c['slug'])
+        comic_bytes = writer.bytes_written
+        if redirect_stubs:
+            stub = render_redirect_stub(cfg, f"{cfg['site_name']} — {c['title']}", slug_page_rel)
+            for rel in secondary:
+                writer.write_text(rel, stub, page_fp)
+        else:
+            variants += secondary
+        for rel in variants:
+            writer.write_text(rel, html, page_fp)
+        if oembed_outputs:
+            # Alias documents are identical, so lookups by an old URL's slug work too
+            oembed = render_oembed(cfg, c, slug_page_rel, og_image_rel, og_width, og_height)
+            for rel in oembed_outputs:
+                writer.write_text(rel, oembed, page_fp)
+        prof.end(sp, writer.bytes_written - comic_bytes)
+    prof.end(pages_sp, writer.bytes_written - pages_bytes)
+
+    sp = prof.begin("stage.finish")
+    finish_bytes = writer.bytes_written
+    # Host redirect map so numeric/alias URLs can be answered without HTML
+    if cfg.get('redirect_map'):
+        writer.write_text("_redirects", "".join(f"{src} {dst} 301\n" for src, dst in redirects))
+
+    if cfg.get('headers_file'):
+        writer.write_text("_headers", render_headers_file(cfg, path_prefix, assets))
+
+    # Sitemap of canonical slug URLs; lastmod only moves when a comic's content does
+    sitemap_url = None
+    if cfg.get('sitemap'):
+        if cfg["base_url"].startswith(("http://", "https://")):
+            lastmods = update_sitemap_history(sitemap_history_path(root), content_hashes, updated_time_iso)
+            entries = [
+                (to_absolute(cfg["base_url"], f"{path_prefix}c/{c['slug']}/"), lastmods[c['slug']],
+                 [to_absolute(cfg["base_url"], u) for u in sitemap_images[c['slug']]])
+                for c in comics
+            ]
+            sitemap_url = write_sitemaps(writer, cfg, path_prefix, entries)
+        else:
+            print("NOTE: sitemap.xml skipped; it needs an absolute base_url (BASE_URL)", file=sys.stderr)
 
-        # Optional alias slug pages that canonical to the main slug
-        aliases = []
-        try:
-            v_alias = c.get('aliases')
-            if isinstance(v_alias, list):
-                aliases = [str(a).strip() for a in v_alias if isinstance(a, (str,)) and str(a).strip()]
-        except Exception:
-            aliases = []
-        for alias in aliases:
-            try:
-                alias_page_rel = f"{path_prefix}c/{alias}/"
-                html_alias = render_page_html2(
-                    cfg, c, i, total, prev_slug, next_slug,
-                    image_url=image_rel,
-                    page_url=alias_page_rel,
-                    canonical_url=slug_page_rel,
-                    og_image_url=og_image_rel,
-                    width=width,
-                    height=height,
-                    og_width=og_width,
-                    og_height=og_height,
-                    og_mime=og_mime,
-                    path_prefix=path_prefix,
-                    build_version=build_version,
-                    updated_time_iso=updated_time_iso,
-                )
-                if srcset_webp:
-                    size_attrs_str = ""
-                    try:
-                        if width and height:
-                            size_attrs_str = f" width=\\\"{int(width)}\\\" height=\\\"{int(height)}\\\""
-                    except Exception:
-                        size_attrs_str = ""
-                    html_alias = html_alias.replace(
-                        f"<img src=\\\"{image_rel}\\\" alt=\\\"{c['title']}\\\" loading=\\\"eager\\\"{size_attrs_str}>",
-                        (
-                            f"<picture>\\n"
-                            f"  <source type=\\\"image/webp\\\" srcset=\\\"{srcset_webp}\\\" sizes=\\\"{sizes_attr}\\\">\\n"
-                            f"  <img src=\\\"{original_image_rel}\\\" alt=\\\"{c['title']}\\\" loading=\\\"eager\\\"{size_attrs_str}>\\n"
-                            f"</picture>"
-                        ),
-                        1,
-                    )
-                html_alias = swap_brand_icons(html_alias, available_icons, path_prefix)
-                alias_dir = os.path.join(out_dir, "c", alias)
-                ensure_dir(alias_dir)
-                with open(os.path.join(alias_dir, "index.html"), "w", encoding="utf-8") as f:
-                    f.write(html_alias)
-            except Exception:
-                pass
+    # robots.txt and a lightweight 404
+    writer.write_text("robots.txt", "User-agent: *\nAllow: /\n" + (f"Sitemap: {sitemap_url}\n" if sitemap_url else ""))
+    writer.write_text("404.html", "<meta charset='utf-8'><meta name='viewport' content='width=device-width,initial-scale=1'><title>Not Found</title><p>Page not found. <a href='/'>Go home</a>.</p>")
 
-        if i == latest_index:
-            latest_html = html_slug
-        if homepage_slug and c.get('slug') == homepage_slug:
-            homepage_html = html_slug
+    # Ensure GitHub Pages does not run Jekyll
+    writer.write_text(".nojekyll", "")
+    prof.end(sp, writer.bytes_written - finish_bytes)
 
-    # The homepage mirrors a chosen slug if provided, otherwise the latest comic
-    chosen_home = homepage_html or latest_html
-    if chosen_home:
-        with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
-            f.write(chosen_home)
 
-    # robots.txt and a lightweight 404
-    with open(os.path.join(out_dir, "robots.txt"), "w", encoding="utf-8") as f:
-        f.write("User-agent: *\nAllow: /\n")
+def main(argv=None):
+    args = parse_args(argv)
+    prof = BuildProfiler(enabled=bool(args.profile))
+    build_sp = prof.begin("build")
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    comics_path = os.path.join(root, "comics.json")
+    comics_dir = os.path.join(root, "comics")
+    out_dir = os.path.join(root, "public")
 
-    with open(os.path.join(out_dir, "404.html"), "w", encoding="utf-8") as f:
-        f.write("<meta charset='utf-8'><meta name='viewport' content='width=device-width,initial-scale=1'><title>Not Found</title><p>Page not found. <a href='/'>Go home</a>.</p>")
+    try:
+        cat = open_catalog(root)
+    except json.JSONDecodeError as e:
+        print(f"ERROR: failed to parse comics.json: {e}", file=sys.stderr)
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if cat.count() == 0 and not os.path.exists(comics_path):
+        print("ERROR: comics.json not found. Run scripts/generate_comics_json.py first.", file=sys.stderr)
+        sys.exit(1)
 
-    # Ensure GitHub Pages does not run Jekyll
-    with open(os.path.join(out_dir, ".nojekyll"), "w", encoding="utf-8") as f:
-        f.write("")
+    # Optional ordering: comics with an integer 'order' come first, ascending;
+    # the rest keep their original relative order after them.
+    comics = cat.ordered()
+    cat.close()
+    # Filter out comics marked invisible
+    comics = [c for c in comics if not (isinstance(c.get('visible'), bool) and c.get('visible') is False)]
+    if not comics:
+        print("ERROR: No comics in comics.json", file=sys.stderr)
+        sys.exit(1)
+
+    cfg = load_site_config(root)
+
+    # Prepare output directories (clean to avoid stale pages with old meta).
+    # Incremental builds keep public/ and instead use the build manifest to
+    # rewrite changed outputs and delete the ones no longer produced.
+    writer = OutputWriter(out_dir, build_manifest_path(root), incremental=args.incremental)
+    ensure_dir(out_dir)
+    if not writer.incremental:
+        clean_dir(out_dir)
+    images_out = os.path.join(out_dir, "images")
+    ensure_dir(images_out)
+    share_out = os.path.join(images_out, "share")
+    ensure_dir(share_out)
 
-    print(f"Built site with {total} comics into {out_dir}")
+    # Optional optimization: create webp alongside originals if Pillow is available
+    try:
+        from PIL import Image  # type: ignore
+        have_pillow = True
+    except Exception:
+        have_pillow = False
+    encode = have_pillow and not args.pages_only
+    if encode and os.environ.get("WEBP_TUNING", "").lower() == "ssim" and webp_tuning_settings() is None:
+        print("NOTE: WEBP_TUNING=ssim needs NumPy; using fixed WEBP_QUALITY", file=sys.stderr)
+    if encode and avif_settings() is None and os.environ.get("AVIF", "1").lower() not in ("0", "false", "no"):
+        print("NOTE: Pillow cannot encode AVIF here (no libavif or pillow-avif-plugin); skipping the AVIF tier", file=sys.stderr)
+    cache = DerivativeCache(derivative_cache_dir(root))
+    stat_cache = StatCache(stat_cache_path(root))
+
+    # Copy images under slug.ext for stable URLs and build derivatives in parallel
+    sp = prof.begin("stage.images")
+    image_results = run_image_stage(comics, comics_dir, images_out, share_out, cache, encode, args.jobs, prof, stat_cache)
+    stat_cache.save()
+    # Record what each comic published; pages are rendered from this alone, and
+    # builds that skip encoding (--pages-only, no Pillow) reuse it
+    meta_path = image_meta_path(root)
+    prev_meta = load_image_meta(meta_path)
+    if not encode:
+        reused = sum(reuse_image_meta(r, prev_meta.get(r["slug"]), cache, images_out) for r in image_results)
+        print(f"Image metadata: reused for {reused} of {len(image_results)} comics ({meta_path})")
+    image_meta = {r["slug"]: {k: r[k] for k in IMAGE_META_KEYS} for r in image_results if r["copied"]}
+    if image_meta != prev_meta:
+        try:
+            save_image_meta(meta_path, image_meta)
+        except OSError as e:
+            print(f"WARNING: could not write {meta_path}: {e}", file=sys.stderr)
+    for r in image_results:
+        for rel in r["outputs"]:
+            writer.track("images/" + rel)
+    if encode:
+        evicted = cache.evict_unused()
+        print(f"Image cache: {cache.hits} hits, {cache.misses} misses, {evicted} evicted ({cache.path})")
+        choices = [t for r in image_results for t in r["webp_tuning"].values()]
+        if choices:
+            modes = {}
+            for t in choices:
+                label = f"q{t['quality']}" if t["mode"] == "lossy" else t["mode"]
+                modes[label] = modes.get(label, 0) + 1
+            print("WebP tuning: " + ", ".join(f"{n}x {m}" for m, n in sorted(modes.items(), key=lambda kv: -kv[1])))
+    # Originals copied, derivatives encoded or copied out of the cache
+    writer.bytes_written += cache.bytes_written
+    prof.end(sp, cache.bytes_written)
+
+    render_site(writer, root, cfg, comics, image_meta, prof)
+
+    # Precompressed siblings for hosts/servers that serve .gz/.br directly
+    if cfg.get('precompress'):
+        sp = prof.begin("stage.compress")
+        compress_bytes = writer.bytes_written
+        zcache = DerivativeCache(compressed_cache_dir(root))
+        suffixes, compressed, zhits = run_precompress_stage(writer, zcache, args.jobs)
+        # Incremental builds don't look up kept siblings, so only evict after full ones
+        evicted = 0 if writer.incremental else zcache.evict_unused()
+        print(f"Precompressed ({'/'.join(suffixes)}): {compressed} written, {zhits} from cache, {evicted} evicted")
+        prof.end(sp, writer.bytes_written - compress_bytes)
+
+    removed = writer.finish()
+    if writer.incremental:
+        print(f"Incremental build: {writer.written} written, {writer.skipped} unchanged, {removed} removed")
+    print(f"Built site with {len(comics)} comics into {out_dir}")
+    prof.end(build_sp, writer.bytes_written)
+    if prof.enabled:
+        trace_path = args.profile if os.path.isabs(args.profile) else os.path.join(root, args.profile)
+        prof.write_trace(trace_path)
+        print(prof.summary(args.profile_top))
+        print(f"Wrote build trace to {trace_path}")
 
 
 if __name__ == "__main__":
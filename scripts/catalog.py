@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""Catalog of comic records, backed by comics.json or an indexed SQLite file.
+
+By default the scripts read and rewrite comics.json directly. Setting
+COMICS_DB=<path> (e.g. .cache/catalog.sqlite) switches them to a SQLite store
+with indexes on file, slug, alias and order, where edits are transactional.
+comics.json stays the import/export format: the database re-imports it when
+the file changed since the last sync, and mutating scripts export it again
+after committing (set COMICS_DB_AUTOEXPORT=0 to skip that and run
+`python3 scripts/catalog.py export` yourself). If comics.json changed while
+the database holds edits that were never exported, opening the catalog fails
+instead of re-importing over them; `export` keeps the database's version,
+`import` takes the file's.
+
+    python3 scripts/catalog.py import|export|stats
+    python3 scripts/catalog.py get <slug-or-alias>
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+
+
+def order_value(c):
+    """Integer order of a record, or None when missing/invalid."""
+    try:
+        return int(c.get("order"))
+    except Exception:
+        return None
+
+
+def aliases_of(c):
+    v = c.get("aliases")
+    if not isinstance(v, list):
+        return []
+    return [str(a).strip() for a in v if isinstance(a, str) and a.strip()]
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_json(path, strict):
+    """Parsed comics.json, or None if missing (or invalid and not strict).
+
+    Invalid means unparsable or without a "comics" list. With strict the
+    error is raised (both are ValueErrors), so a catalog is never saved
+    over a file that could not be read.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            if strict:
+                raise
+            return None
+    if not isinstance(data, dict) or not isinstance(data.get("comics"), list):
+        if strict:
+            raise ValueError("comics.json does not contain a 'comics' list")
+        return None
+    return data
+
+
+def write_comics_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+class JsonCatalog:
+    """The plain comics.json backend: whole file in memory, rewritten on save."""
+
+    backend = "json"
+
+    def __init__(self, json_path, strict=True):
+        self.json_path = json_path
+        self.data = {"comics": []}
+        data = _load_json(json_path, strict)
+        if data is not None:
+            self.data = data
+        self._index()
+
+    def _index(self):
+        self._by_file = {}
+        self._by_slug = {}
+        for c in self.data["comics"]:
+            self._by_file[c.get("file")] = c
+        for c in self.data["comics"]:
+            for a in aliases_of(c):
+                self._by_slug.setdefault(a, c)
+        # Primary slugs win over aliases
+        for c in self.data["comics"]:
+            self._by_slug[c.get("slug")] = c
+
+    def all(self):
+        return list(self.data["comics"])
+
+    def count(self):
+        return len(self.data["comics"])
+
+    def ordered(self):
+        """Comics sorted for display: by order, unordered last, ties by file order."""
+        def key(item):
+            idx, c = item
+            val = order_value(c)
+            return (val is None, val or 0, idx)
+        return [c for _, c in sorted(enumerate(self.data["comics"]), key=key)]
+
+    def get_by_file(self, name):
+        return self._by_file.get(name)
+
+    def get_by_slug(self, slug):
+        """Look up a comic by its slug or one of its aliases."""
+        return self._by_slug.get(slug)
+
+    def replace_all(self, comics):
+        self.data["comics"] = list(comics)
+        self._index()
+
+    def update(self, comic):
+        self.update_many([comic])
+
+    def update_many(self, comics):
+        """Replace records matched by file (appending unknown ones)."""
+        pos = {c.get("file"): n for n, c in enumerate(self.data["comics"])}
+        for c in comics:
+            n = pos.get(c.get("file"))
+            if n is None:
+                pos[c.get("file")] = len(self.data["comics"])
+                self.data["comics"].append(c)
+            else:
+                self.data["comics"][n] = c
+        self._index()
+
+    def save(self):
+        write_comics_json(self.json_path, self.data)
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comics (
+    pos INTEGER PRIMARY KEY,
+    file TEXT NOT NULL UNIQUE,
+    slug TEXT NOT NULL,
+    ord INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comics_slug ON comics(slug);
+CREATE INDEX IF NOT EXISTS comics_ord ON comics(ord, pos);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT NOT NULL,
+    file TEXT NOT NULL,
+    PRIMARY KEY (alias, file)
+);
+CREATE INDEX IF NOT EXISTS aliases_file ON aliases(file);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class SqliteCatalog:
+    """Indexed SQLite store; comics.json is imported/exported around it.
+
+    Records are stored whole (as JSON) so unknown fields round-trip; file,
+    slug, order and aliases are mirrored into indexed columns. `pos` keeps
+    the comics.json order.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_path, json_path, autoexport=True, strict=True, sync=True):
+        self.db_path = db_path
+        self.json_path = json_path
+        self.autoexport = autoexport
+        self.strict = strict
+        d = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(d, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.dirty = False
+        if sync:
+            self.sync_from_json()
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def sync_from_json(self, force=False):
+        """Re-import comics.json if it changed since the last import/export.
+
+        Raises ValueError rather than re-importing when the database also has
+        edits that were never exported (force discards them).
+        """
+        if not os.path.exists(self.json_path):
+            return False
+        digest = _file_sha256(self.json_path)
+        if not force and digest == self._meta("json_sha256"):
+            return False
+        if not force and self._meta("unexported"):
+            raise ValueError(
+                "comics.json changed since the catalog database was last exported, and the database has "
+                "edits that were never exported (COMICS_DB_AUTOEXPORT=0). Run `python3 scripts/catalog.py export` "
+                "to keep the database's version, or `python3 scripts/catalog.py import` to take comics.json's."
+            )
+        data = _load_json(self.json_path, self.strict)
+        if data is None:
+            return False
+        comics = data["comics"]
+        extra = {k: v for k, v in data.items() if k != "comics"}
+        with self.conn:
+            self._write_all(comics)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('extra', ?)", (json.dumps(extra),))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_sha256', ?)", (digest,))
+            self.conn.execute("DELETE FROM meta WHERE key='unexported'")
+        return True
+
+    def _mark_unexported(self):
+        # Persisted (unlike self.dirty) so a later run knows comics.json is behind
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('unexported', '1')")
+
+    def _write_all(self, comics):
+        self.conn.execute("DELETE FROM comics")
+        self.conn.execute("DELETE FROM aliases")
+        for pos, c in enumerate(comics):
+            self._insert(pos, c)
+
+    def _insert(self, pos, c):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO comics (pos, file, slug, ord, data) VALUES (?, ?, ?, ?, ?)",
+            (pos, c.get("file"), c.get("slug") or "", order_value(c), json.dumps(c, ensure_ascii=False)),
+        )
+        self.conn.execute("DELETE FROM aliases WHERE file=?", (c.get("file"),))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO aliases (alias, file) VALUES (?, ?)",
+            [(a, c.get("file")) for a in aliases_of(c)],
+        )
+
+    def all(self):
+        return [json.loads(r[0]) for r in self.conn.execute("SELECT data FROM comics ORDER BY pos")]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM comics").fetchone()[0]
+
+    def ordered(self):
+        """Comics sorted for display: by order, unordered last, ties by file order."""
+        rows = self.conn.execute("SELECT data FROM comics ORDER BY ord IS NULL, ord, pos")
+        return [json.loads(r[0]) for r in rows]
+
+    def get_by_file(self, name):
+        row = self.conn.execute("SELECT data FROM comics WHERE file=?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_by_slug(self, slug):
+        """Look up a comic by its slug or one of its aliases."""
+        row = self.conn.execute("SELECT data FROM comics WHERE slug=? ORDER BY pos LIMIT 1", (slug,)).fetchone()
+        if row is None:
+            row = self.conn.execute(
+                "SELECT c.data FROM aliases a JOIN comics c ON c.file=a.file WHERE a.alias=? ORDER BY c.pos LIMIT 1",
+                (slug,),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def replace_all(self, comics):
+        with self.conn:
+            self._write_all(comics)
+            self._mark_unexported()
+        self.dirty = True
+
+    def update(self, comic):
+        self.update_many([comic])
+
+    def update_many(self, comics):
+        """Replace records (matched by file) in a single transaction."""
+        with self.conn:
+            for c in comics:
+                row = self.conn.execute("SELECT pos FROM comics WHERE file=?", (c.get("file"),)).fetchone()
+                if row is None:
+                    row = self.conn.execute("SELECT COALESCE(MAX(pos), -1) + 1 FROM comics").fetchone()
+                self._insert(row[0], c)
+            self._mark_unexported()
+        self.dirty = True
+
+    def export_json(self):
+        extra = json.loads(self._meta("extra") or "{}")
+        data = dict(extra)
+        data["comics"] = self.all()
+        write_comics_json(self.json_path, data)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_sha256', ?)", (_file_sha256(self.json_path),))
+            self.conn.execute("DELETE FROM meta WHERE key='unexported'")
+        self.dirty = False
+
+    def save(self):
+        # Changes are already committed; keep comics.json in step unless disabled
+        if self.autoexport and self.dirty:
+            self.export_json()
+
+    def close(self):
+        self.conn.close()
+
+
+def stat_cache_path(root):
+    return os.path.join(root, ".cache", "comics-stat.json")
+
+
+class StatCache:
+    """Persisted (inode, size, mtime) -> sha256 map for files in comics/.
+
+    Lets rescans and builds skip re-reading sources whose stat is unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data.get("files"), dict):
+                self.files = data["files"]
+        except Exception:
+            pass
+
+    @staticmethod
+    def _sig(st):
+        return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def lookup(self, name, st):
+        """Cached hash for name if its stat signature is unchanged, else None."""
+        e = self.files.get(name)
+        if e and e[:3] == self._sig(st):
+            return e[3]
+        return None
+
+    def record(self, name, st, digest):
+        e = self._sig(st) + [digest]
+        if self.files.get(name) != e:
+            self.files[name] = e
+            self.dirty = True
+
+    def hash(self, name, path, st=None):
+        st = st or os.stat(path)
+        digest = self.lookup(name, st)
+        if digest is None:
+            digest = _file_sha256(path)
+            self.record(name, st, digest)
+        return digest
+
+    def retain(self, names):
+        """Drop entries for files that no longer exist."""
+        names = set(names)
+        for name in [n for n in self.files if n not in names]:
+            del self.files[name]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def open_catalog(root, strict=True, sync=True):
+    """Open the configured catalog for a project root (COMICS_DB selects SQLite).
+
+    With strict=False an unparsable comics.json, or one without a "comics"
+    list, is treated as empty instead of raising ValueError. sync=False opens
+    the SQLite store without re-importing a changed comics.json.
+    """
+    json_path = os.path.join(root, "comics.json")
+    db = os.environ.get("COMICS_DB")
+    if db:
+        if not os.path.isabs(db):
+            db = os.path.join(root, db)
+        autoexport = os.environ.get("COMICS_DB_AUTOEXPORT", "1").lower() not in ("0", "false", "no")
+        return SqliteCatalog(db, json_path, autoexport=autoexport, strict=strict, sync=sync)
+    return JsonCatalog(json_path, strict=strict)
+
+
+def main():
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if not os.environ.get("COMICS_DB"):
+        os.environ["COMICS_DB"] = os.path.join(".cache", "catalog.sqlite")
+    try:
+        # import/export settle a conflict themselves, so don't sync first
+        cat = open_catalog(root, sync=cmd not in ("import", "export"))
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        if cmd == "import":
+            cat.sync_from_json(force=True)
+            print(f"Imported {cat.count()} comics into {cat.db_path}")
+        elif cmd == "export":
+            cat.export_json()
+            print(f"Exported {cat.count()} comics to {cat.json_path}")
+        elif cmd == "stats":
+            n_alias = cat.conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+            print(f"{cat.db_path}: {cat.count()} comics, {n_alias} aliases")
+        elif cmd == "get" and len(sys.argv) > 2:
+            c = cat.get_by_slug(sys.argv[2])
+            if c is None:
+                print(f"ERROR: no comic with slug or alias {sys.argv[2]!r}", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(c, indent=2, ensure_ascii=False))
+        else:
+            print(__doc__.strip(), file=sys.stderr)
+            sys.exit(2)
+    finally:
+        cat.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
-import json
 import os
 import re
 import sys
 from datetime import datetime
 
+from catalog import StatCache, open_catalog, stat_cache_path
+
 IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif"}
 
 
@@ -22,17 +23,44 @@ def title_from_slug(slug: str) -> str:
     return words.title() if words else "Untitled"
 
 
-def load_existing(path: str):
-    if not os.path.exists(path):
-        return {"comics": []}
-    with open(path, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-            if not isinstance(data, dict) or "comics" not in data:
-                return {"comics": []}
-            return data
-        except json.JSONDecodeError:
-            return {"comics": []}
+class SlugAllocator:
+    """Hands out unique slugs, suffixing duplicates with -2, -3, ...
+
+    Remembers the next free suffix per base slug so repeated collisions don't
+    re-probe every taken suffix.
+    """
+
+    def __init__(self):
+        self.used = set()
+        self.next_suffix = {}
+
+    def allocate(self, base_slug: str) -> str:
+        slug = base_slug
+        if slug in self.used:
+            i = self.next_suffix.get(base_slug, 2)
+            while f"{base_slug}-{i}" in self.used:
+                i += 1
+            slug = f"{base_slug}-{i}"
+            self.next_suffix[base_slug] = i + 1
+        self.used.add(slug)
+        return slug
+
+
+def scan_comics(comics_dir):
+    """One scandir pass over comics/; returns (name, path, stat) per image file."""
+    files = []
+    with os.scandir(comics_dir) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTS:
+                continue
+            try:
+                if entry.is_file():
+                    files.append((entry.name, entry.path, entry.stat()))
+            except OSError:
+                continue
+    return files
 
 
 def main():
@@ -45,45 +73,41 @@ def main():
         sys.exit(1)
 
     # Discover image files
-    files = []
-    for name in os.listdir(comics_dir):
-        if name.startswith('.'):
-            continue
-        ext = os.path.splitext(name)[1].lower()
-        if ext in IMAGE_EXTS:
-            full = os.path.join(comics_dir, name)
-            if os.path.isfile(full):
-                files.append((name, full))
+    files = scan_comics(comics_dir)
 
     if not files:
         print("No image files found in comics/", file=sys.stderr)
         sys.exit(1)
 
     # Sort by file modification time ascending (older first)
-    files.sort(key=lambda t: os.path.getmtime(t[1]))
-
-    existing = load_existing(out_path)
-    existing_by_file = {c.get("file"): c for c in existing.get("comics", [])}
+    files.sort(key=lambda t: t[2].st_mtime)
+
+    # Content hashes are only computed for new or modified files; build_site.py
+    # reuses them for its derivative cache keys.
+    stat_cache = StatCache(stat_cache_path(root))
+    for (name, full, st) in files:
+        stat_cache.hash(name, full, st)
+    stat_cache.retain(name for name, _, _ in files)
+    stat_cache.save()
+
+    try:
+        catalog = open_catalog(root, strict=False)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
     # Track slugs we assign during this run to avoid duplicates while
     # preserving existing slugs for their own files.
-    used_slugs = set()
+    slugs = SlugAllocator()
 
     comics = []
-    for (name, full) in files:
-        mtime = os.path.getmtime(full)
-        created = datetime.fromtimestamp(mtime).isoformat(timespec='seconds')
+    for (name, full, st) in files:
+        created = datetime.fromtimestamp(st.st_mtime).isoformat(timespec='seconds')
         ext = os.path.splitext(name)[1].lower()
 
-        prev = existing_by_file.get(name)
+        prev = catalog.get_by_file(name)
         if prev:
             # Preserve existing slug if present
-            slug = prev.get("slug") or slugify(name)
-            base_slug = slug
-            i = 2
-            while slug in used_slugs:
-                slug = f"{base_slug}-{i}"
-                i += 1
-            used_slugs.add(slug)
+            slug = slugs.allocate(prev.get("slug") or slugify(name))
 
             title = prev.get("title") or title_from_slug(slug)
             desc = prev.get("description") or ""
@@ -100,13 +124,7 @@ def main():
             except Exception:
                 aliases_val = None
         else:
-            slug = slugify(name)
-            base_slug = slug
-            i = 2
-            while slug in used_slugs:
-                slug = f"{base_slug}-{i}"
-                i += 1
-            used_slugs.add(slug)
+            slug = slugs.allocate(slugify(name))
 
             title = title_from_slug(slug)
             desc = ""
@@ -130,11 +148,14 @@ def main():
             entry["aliases"] = aliases_val
         comics.append(entry)
 
-    out = {"comics": comics}
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(out, f, indent=2, ensure_ascii=False)
+    catalog.replace_all(comics)
+    catalog.save()
+    catalog.close()
 
-    print(f"Wrote {out_path} with {len(comics)} comics")
+    if catalog.backend == "sqlite":
+        print(f"Updated {catalog.db_path} with {len(comics)} comics")
+    else:
+        print(f"Wrote {out_path} with {len(comics)} comics")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""Local preview server that rebuilds the site in memory as you edit.
+
+    python3 scripts/serve.py [--port 8000]
+
+Pages are rendered with build_site.py's own code but kept in memory instead
+of public/; images are placed under .cache/serve/images from the shared
+derivative cache. comics/, comics.json, site_config.json and assets/icons/
+are polled, and an edit only re-renders the comics it touches: the edited
+comic, its previous/next neighbours and any comic whose position or homepage
+status changed. Config and icon edits re-render everything. Open pages
+reload themselves after each rebuild.
+
+Shared assets keep plain names (site.css, site.js, search/<prefix>.json) so
+pages that were not re-rendered still point at current files. Precompression,
+the sitemap and the likes snapshot are left to real builds.
+"""
+import argparse
+import hashlib
+import mimetypes
+import os
+import shutil
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from build_site import (IMAGE_META_KEYS, DerivativeCache, OutputWriter, derivative_cache_dir, homepage_slug,
+                        image_meta_path, load_image_meta, load_site_config, render_site, reuse_image_meta,
+                        run_image_stage)
+from catalog import StatCache, open_catalog, stat_cache_path
+
+WATCHED_FILES = ("comics.json", "site_config.json")
+WATCHED_DIRS = ("comics", os.path.join("assets", "icons"))
+LIVERELOAD = "__livereload"
+LIVERELOAD_PING_S = 15
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+class MemoryWriter(OutputWriter):
+    """OutputWriter that keeps outputs in a dict instead of writing them under out_dir.
+
+    Starts from the previous round's files and manifest, so outputs whose
+    fingerprint is unchanged are kept without being rendered again.
+    """
+
+    def __init__(self, files=None, prev=None):
+        super().__init__(None, None)
+        self.files = dict(files or {})
+        self.prev = dict(prev or {})
+        self.incremental = True
+
+    def fresh(self, rel, fp):
+        return self.prev.get(rel) == fp and rel in self.files
+
+    def put(self, rel, data, fp):
+        self.files[rel] = data
+        self.cur[rel] = fp
+        self.written += 1
+        self.bytes_written += len(data)
+
+    def write_text(self, rel, text, fp=None):
+        data = text.encode("utf-8")
+        if fp is None:
+            fp = hashlib.sha256(data).hexdigest()
+        if self.fresh(rel, fp):
+            self.keep(rel, fp)
+            return False
+        self.put(rel, data, fp)
+        return True
+
+    def copy_file(self, src, rel):
+        with open(src, "rb") as f:
+            data = f.read()
+        fp = hashlib.sha256(data).hexdigest()
+        if self.fresh(rel, fp):
+            self.keep(rel, fp)
+            return False
+        self.put(rel, data, fp)
+        return True
+
+    def finish(self):
+        """Drop outputs that are no longer produced; returns how many."""
+        stale = set(self.files) - set(self.cur)
+        for rel in stale:
+            del self.files[rel]
+        return len(stale)
+
+
+def dir_signature(path):
+    """(name, mtime_ns, size) for each file in path, sorted; empty when missing."""
+    sig = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                sig.append((entry.name, st.st_mtime_ns, st.st_size))
+    except OSError:
+        pass
+    return tuple(sorted(sig))
+
+
+def snapshot(root):
+    """Cheap signature of every watched input, compared between polls."""
+    files = []
+    for rel in WATCHED_FILES:
+        try:
+            st = os.stat(os.path.join(root, rel))
+            files.append((rel, st.st_mtime_ns, st.st_size))
+        except OSError:
+            files.append((rel, None, None))
+    return tuple(files), tuple(dir_signature(os.path.join(root, d)) for d in WATCHED_DIRS)
+
+
+def positions(cfg, comics):
+    """Per slug, everything about a comic's place in the list that its pages show."""
+    home = homepage_slug(cfg, comics)
+    n = len(comics)
+    return {c["slug"]: (i, comics[i - 1]["slug"], comics[(i + 1) % n]["slug"], c["slug"] == home)
+            for i, c in enumerate(comics)}
+
+
+class Preview:
+    """The current in-memory build, plus what it was rendered from."""
+
+    def __init__(self, root, encode, jobs):
+        self.root = root
+        self.encode = encode
+        self.jobs = jobs
+        self.comics_dir = os.path.join(root, "comics")
+        self.images_dir = os.path.join(root, ".cache", "serve", "images")
+        # Start from an empty directory; originals are re-copied and
+        # derivatives placed from the cache, so this is cheap
+        shutil.rmtree(self.images_dir, ignore_errors=True)
+        os.makedirs(os.path.join(self.images_dir, "share"))
+        self.cache = DerivativeCache(derivative_cache_dir(root))
+        self.stat_cache = StatCache(stat_cache_path(root))
+        # Without encoding, derivatives come from the last real build's records
+        self.image_meta = {} if encode else load_image_meta(image_meta_path(root))
+        self.sources = {}       # slug -> image inputs last processed
+        self.image_outputs = {}  # slug -> files under images_dir
+        self.files = {}         # rel -> bytes, replaced as a whole after each rebuild
+        self.outputs = {}       # rel -> fingerprint (the writer's manifest)
+        self.cfg = None
+        self.icons = None
+        self.comics = {}
+        self.positions = {}
+        self.base_path = "/"
+        self.nonce = format(time.time_ns(), "x")
+        self.rounds = 0
+        self.version = self.nonce
+        self.changed = threading.Condition()
+
+    def update_images(self, comics):
+        """Process comics whose source file changed; returns slugs whose image metadata changed."""
+        keys = {}
+        todo = []
+        for c in comics:
+            try:
+                st = os.stat(os.path.join(self.comics_dir, c["file"]))
+                sig = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                sig = None
+            keys[c["slug"]] = (c["file"], c["ext"], sig)
+            if self.sources.get(c["slug"]) != keys[c["slug"]]:
+                todo.append(c)
+        changed = set()
+        old = set()
+        if todo:
+            results = run_image_stage(todo, self.comics_dir, self.images_dir, os.path.join(self.images_dir, "share"),
+                                      self.cache, self.encode, self.jobs if len(todo) > 1 else 1,
+                                      stat_cache=self.stat_cache)
+            self.stat_cache.save()
+            for r in results:
+                if not self.encode:
+                    reuse_image_meta(r, self.image_meta.get(r["slug"]), self.cache, self.images_dir)
+                meta = {k: r[k] for k in IMAGE_META_KEYS} if r["copied"] else None
+                if meta != self.image_meta.get(r["slug"]):
+                    changed.add(r["slug"])
+                if meta:
+                    self.image_meta[r["slug"]] = meta
+                else:
+                    self.image_meta.pop(r["slug"], None)
+                old.update(self.image_outputs.get(r["slug"], ()))
+                self.image_outputs[r["slug"]] = r["outputs"]
+        self.sources = keys
+        for slug in set(self.image_meta) - set(keys):
+            del self.image_meta[slug]
+        for slug in set(self.image_outputs) - set(keys):
+            old.update(self.image_outputs.pop(slug))
+        # Remove files nothing publishes any more (replaced or deleted comics)
+        live = {rel for outputs in self.image_outputs.values() for rel in outputs}
+        for rel in old - live:
+            try:
+                os.remove(os.path.join(self.images_dir, *rel.split("/")))
+            except OSError:
+                pass
+        return changed
+
+    def affected(self, comics, new_positions, images):
+        """Slugs to re-render after an edit to comics.json or comics/."""
+        by_slug = {c["slug"]: c for c in comics}
+        edited = {s for s, c in by_slug.items() if self.comics.get(s) != c} | images
+        # Neighbours of edited or removed comics, looked up in both orders
+        only = set(edited)
+        for slug in edited | (set(self.comics) - set(by_slug)):
+            for pos in (self.positions.get(slug), new_positions.get(slug)):
+                if pos:
+                    only.update(pos[1:3])
+        only.update(s for s, pos in new_positions.items() if self.positions.get(s) != pos)
+        return only & set(by_slug)
+
+    def rebuild(self):
+        """Re-render what changed since the last round; returns a one-line summary."""
+        t0 = time.perf_counter()
+        cat = open_catalog(self.root)
+        comics = cat.ordered()
+        cat.close()
+        comics = [c for c in comics if not (isinstance(c.get('visible'), bool) and c.get('visible') is False)]
+        if not comics:
+            raise ValueError("no visible comics in comics.json")
+        cfg = load_site_config(self.root)
+        cfg.update(precompress=False, sitemap=False, likes_snapshot=None)
+        icons = dir_signature(os.path.join(self.root, "assets", "icons"))
+        new_positions = positions(cfg, comics)
+
+        images = self.update_images(comics)
+        only = None
+        if self.files and cfg == self.cfg and icons == self.icons:
+            only = self.affected(comics, new_positions, images)
+        writer = MemoryWriter(self.files, self.outputs)
+        try:
+            render_site(writer, self.root, cfg, comics, self.image_meta, hashed_names=False, only=only)
+        except BaseException:
+            # Image metadata already moved on; make the next round re-check every comic
+            self.cfg = None
+            raise
+        removed = writer.finish()
+
+        with self.changed:
+            self.files, self.outputs = writer.files, writer.cur
+            self.cfg, self.icons = cfg, icons
+            self.comics = {c["slug"]: c for c in comics}
+            self.positions = new_positions
+            self.base_path = cfg.get("base_path") or "/"
+            if writer.written or removed:
+                self.rounds += 1
+                self.version = f"{self.nonce}.{self.rounds}"
+                self.changed.notify_all()
+        scope = "all comics" if only is None else f"{len(only)} comic(s)"
+        return (f"Rebuilt {scope} in {time.perf_counter() - t0:.2f}s: "
+                f"{writer.written} written, {writer.skipped} unchanged, {removed} removed")
+
+    def read_image(self, rel):
+        path = os.path.normpath(os.path.join(self.images_dir, *rel.split("/")))
+        if not path.startswith(self.images_dir + os.sep) or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def reload_script(base_path):
+    return (f'<script>(function(){{var v,es=new EventSource("{base_path}{LIVERELOAD}");'
+            'es.onmessage=function(e){if(v&&e.data!==v)location.reload();v=e.data;};})();</script>')
+
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    server_version = "ComicsPreview"
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def log_message(self, fmt, *args):
+        pass  # rebuild summaries are the useful output
+
+    def respond(self, send_body):
+        preview = self.server.preview
+        base = preview.base_path
+        path = unquote(urlsplit(self.path).path)
+        if not path.startswith(base):
+            if path in ("/", base.rstrip("/")):
+                return self.redirect(base)
+            return self.send(404, "404.html", preview.files.get("404.html", b"Not found"), send_body)
+        rel = path[len(base):]
+        if rel == LIVERELOAD:
+            return self.events(preview)
+        if rel == "" or rel.endswith("/"):
+            rel += "index.html"
+        files = preview.files
+        data = preview.read_image(rel[len("images/"):]) if rel.startswith("images/") else files.get(rel)
+        if data is None and f"{rel}/index.html" in files:
+            return self.redirect(path + "/")
+        if data is None:
+            return self.send(404, "404.html", files.get("404.html", b"Not found"), send_body)
+        if rel.endswith(".html"):
+            data = data.replace(b"</body>", reload_script(base).encode("utf-8") + b"</body>", 1)
+        self.send(200, rel, data, send_body)
+
+    def send(self, status, rel, data, send_body):
+        ctype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if ctype.startswith("text/") or ctype in ("application/json", "application/javascript", "image/svg+xml"):
+            ctype += "; charset=utf-8"
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def events(self, preview):
+        """Server-sent events: the build version now and after every rebuild."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        sent = None
+        try:
+            while True:
+                with preview.changed:
+                    preview.changed.wait_for(lambda: preview.version != sent, timeout=LIVERELOAD_PING_S)
+                    version = preview.version
+                if version != sent:
+                    self.wfile.write(f"data: {version}\n\n".encode("ascii"))
+                    sent = version
+                else:
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except OSError:
+            pass  # browser navigated away
+
+
+def watch(root, preview, interval):
+    last = snapshot(root)
+    while True:
+        time.sleep(interval)
+        cur = snapshot(root)
+        if cur == last:
+            continue
+        last = cur
+        try:
+            print(preview.rebuild())
+        except (Exception, SystemExit) as e:
+            # e.g. comics.json caught half-written; the next save triggers another round
+            print(f"ERROR: Rebuild failed, still serving the previous build: {e}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview the site locally, rebuilding in memory on every edit.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--interval", type=float, default=0.25, metavar="SECONDS",
+                        help="how often inputs are polled for changes (default 0.25)")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                        help="worker processes when many images need processing (default: CPU count)")
+    parser.add_argument("--pages-only", action="store_true",
+                        help="skip image encoding; use the last build's recorded derivatives (works without Pillow)")
+    args = parser.parse_args()
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    try:
+        from PIL import Image  # type: ignore  # noqa: F401
+        have_pillow = True
+    except Exception:
+        have_pillow = False
+    preview = Preview(root, have_pillow and not args.pages_only, max(1, args.jobs))
+    try:
+        print(preview.rebuild())
+    except (Exception, SystemExit) as e:
+        print(f"ERROR: Initial build failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    server = ThreadingHTTPServer((args.host, args.port), PreviewHandler)
+    server.daemon_threads = True
+    server.preview = preview
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving preview at http://{args.host}:{server.server_address[1]}{preview.base_path} (Ctrl+C to stop)")
+    try:
+        watch(root, preview, args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,21 @@ export default {
       'Cache-Control': 'no-store',
     };
     if (request.method === 'OPTIONS') return new Response(null, { headers: cors });
+    // Optional: answer numeric/alias comic URLs from the build's _redirects map
+    const redirectTo = redirectFor(url.pathname, env);
+    if (redirectTo) return Response.redirect(new URL(redirectTo, url).toString(), 301);
     // oEmbed endpoint: /oembed?url=...
     if (url.pathname.endsWith('/oembed')) {
       const target = url.searchParams.get('url') || '';
       if (!target) return json({ error: 'missing url' }, cors, 400);
       try {
+        // Comic pages have a static oEmbed document written by the build
+        // (oembed/<slug>.json); serve that instead of scraping the page
+        const doc = staticOembedUrl(target);
+        if (doc) {
+          const res = await fetch(doc);
+          if (res.ok) return new Response(res.body, { headers: { ...cors, 'Content-Type': 'application/json; charset=utf-8' } });
+        }
         const res = await fetch(target, { redirect: 'follow' });
         if (!res.ok) return json({ error: 'fetch_failed' }, cors, 502);
         const html = await res.text();
@@ -38,6 +48,15 @@ export default {
       }
     }
 
+    // Batch read: /likes?slugs=a,b,c -> { counts: { a: n, ... } }
+    if (url.pathname.endsWith('/likes') && url.searchParams.has('slugs')) {
+      const slugs = url.searchParams.get('slugs').split(',').map((s) => s.trim()).filter(Boolean);
+      if (!slugs.length || slugs.length > 100) return json({ error: 'bad slugs' }, cors, 400);
+      const values = await Promise.all(slugs.map((s) => env.LIKES.get(`slug:${s}`)));
+      const counts = {};
+      slugs.forEach((s, i) => { counts[s] = Number(values[i] || 0); });
+      return json({ counts }, cors);
+    }
     if (!slug) return json({ error: 'missing slug' }, cors, 400);
     const key = `slug:${slug}`;
     if (url.pathname.endsWith('/likes')) {
@@ -46,8 +65,11 @@ export default {
       return json({ slug, count }, cors);
     }
     if (url.pathname.endsWith('/hit')) {
+      // Clients merge rapid repeat clicks into one request (?amount=, 1-50)
+      const amount = Number(url.searchParams.get('amount') || 1);
+      if (!Number.isInteger(amount) || amount < 1 || amount > 50) return json({ error: 'bad amount' }, cors, 400);
       const v = await env.LIKES.get(key);
-      let count = Number(v || 0) + 1;
+      let count = Number(v || 0) + amount;
       await env.LIKES.put(key, String(count));
       return json({ slug, count }, cors);
     }
@@ -59,6 +81,30 @@ function json(data, headers = {}, status = 200) {
   return new Response(JSON.stringify(data), { status, headers: { 'content-type': 'application/json; charset=utf-8', ...headers } });
 }
 
+// REDIRECTS: contents of public/_redirects ("<from> <to> 301" per line),
+// bound as a text variable. Parsed once per isolate.
+let redirectMap = null;
+function redirectFor(pathname, env) {
+  if (!env.REDIRECTS) return null;
+  if (!redirectMap) {
+    redirectMap = new Map();
+    for (const line of String(env.REDIRECTS).split('\n')) {
+      const [from, to] = line.trim().split(/\s+/);
+      if (from && to && !from.startsWith('#')) redirectMap.set(from, to);
+    }
+  }
+  const p = pathname.endsWith('/') ? pathname : pathname + '/';
+  return redirectMap.get(p) || null;
+}
+
+// https://site/<base>/c/<slug>/ -> https://site/<base>/oembed/<slug>.json
+function staticOembedUrl(target) {
+  let u;
+  try { u = new URL(target); } catch (e) { return null; }
+  const m = u.pathname.match(/^(.*\/)c\/([^/]+)\/?(?:index\.html)?$/);
+  return m ? `${u.origin}${m[1]}oembed/${m[2]}.json` : null;
+}
+
 function extractOG(html) {
   const out = {};
   function m(re) { const r = html.match(re); return r ? r[1] : null; }
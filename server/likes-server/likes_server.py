@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Self-hosted likes API with the same contract as the Cloudflare Worker.
+
+    GET /likes?slug=<slug>        -> {"slug": ..., "count": n}
+    GET /hit?slug=<slug>          -> {"slug": ..., "count": n}  (increments)
+    GET /hit?slug=<slug>&amount=k -> same, adding k (1-50) merged clicks
+    GET /likes?slugs=a,b,c        -> {"counts": {"a": n, ...}}
+
+Counters live in memory and every request is answered from there. Hits are
+coalesced per slug and flushed to SQLite in one transaction every
+--flush-interval seconds (and on shutdown), so a burst of clicks costs one
+row write per slug rather than one per click. Like the Worker, paths only
+need to end in /likes or /hit, so it can sit behind a prefix such as /api.
+
+Standard library only:
+
+    python3 server/likes-server/likes_server.py --port 8787
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+MAX_SLUG_LEN = 200
+MAX_BATCH = 100
+MAX_HIT_AMOUNT = 50
+MAX_HEADER_LINES = 100
+
+CORS_HEADERS = (
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET,OPTIONS"),
+    ("Access-Control-Allow-Headers", "content-type"),
+    ("Cache-Control", "no-store"),
+)
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def default_db_path():
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    return os.path.join(root, ".cache", "likes.sqlite")
+
+
+class LikesStore:
+    """In-memory counters backed by SQLite, with hits batched between flushes."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Flushes run in a worker thread, one at a time (see flush()), while
+        # hits keep arriving on the event loop
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS likes (slug TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        self.conn.commit()
+        self.counts = dict(self.conn.execute("SELECT slug, count FROM likes"))
+        self.pending = {}
+        self._lock = threading.Lock()  # guards pending
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+
+    def get(self, slug):
+        return self.counts.get(slug, 0)
+
+    def hit(self, slug, amount=1):
+        count = self.counts[slug] = self.counts.get(slug, 0) + amount
+        with self._lock:
+            self.pending[slug] = self.pending.get(slug, 0) + amount
+        return count
+
+    def flush(self):
+        """Write pending increments in one transaction; returns the number of slugs written.
+
+        Increments are added to the stored counts rather than overwriting them,
+        so a failed flush can simply be retried with the deltas merged back in.
+        """
+        with self._flush_lock:
+            # Detach the batch under the lock; the write itself runs without it
+            # so hits are never held up by SQLite
+            with self._lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT INTO likes (slug, count) VALUES (?, ?) "
+                        "ON CONFLICT(slug) DO UPDATE SET count = count + excluded.count",
+                        batch.items(),
+                    )
+            except Exception:
+                with self._lock:
+                    for slug, n in batch.items():
+                        self.pending[slug] = self.pending.get(slug, 0) + n
+                raise
+            self.flushes += 1
+            return len(batch)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def valid_slug(slug):
+    return bool(slug) and len(slug) <= MAX_SLUG_LEN and slug.isprintable()
+
+
+def route(store, method, target):
+    """Answer one request; returns (status, payload or None)."""
+    if method == "OPTIONS":
+        return 204, None
+    if method != "GET":
+        return 405, {"error": "method not allowed"}
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    path = url.path.rstrip("/")
+    if path.endswith("/likes") and "slugs" in query:
+        slugs = [s.strip() for s in ",".join(query["slugs"]).split(",") if s.strip()]
+        if not slugs or len(slugs) > MAX_BATCH or not all(valid_slug(s) for s in slugs):
+            return 400, {"error": "bad slugs"}
+        return 200, {"counts": {s: store.get(s) for s in slugs}}
+    if not (path.endswith("/likes") or path.endswith("/hit")):
+        return 404, {"error": "not found"}
+    slug = (query.get("slug") or [""])[0].strip()
+    if not valid_slug(slug):
+        return 400, {"error": "missing slug"}
+    if path.endswith("/hit"):
+        amount = (query.get("amount") or ["1"])[0]
+        if not amount.isdigit() or not 1 <= int(amount) <= MAX_HIT_AMOUNT:
+            return 400, {"error": "bad amount"}
+        return 200, {"slug": slug, "count": store.hit(slug, int(amount))}
+    return 200, {"slug": slug, "count": store.get(slug)}
+
+
+def render_response(status, payload, keep_alive):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{k}: {v}" for k, v in CORS_HEADERS]
+    if payload is not None:
+        lines.append("Content-Type: application/json; charset=utf-8")
+    lines.append(f"Content-Length: {len(body)}")
+    lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def handle_connection(store, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) != 3:
+                writer.write(render_response(400, {"error": "bad request"}, False))
+                break
+            method, target, version = parts
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length:
+                await reader.readexactly(length)  # bodies are ignored
+            conn = headers.get("connection", "").lower()
+            keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+            status, payload = route(store, method.upper(), target)
+            writer.write(render_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def flush_loop(store, interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(store.flush)
+        except Exception as e:
+            # Keep the loop alive whatever went wrong; the batch was re-queued
+            print(f"WARNING: flush to {store.db_path} failed, will retry: {e}", file=sys.stderr)
+
+
+async def serve(args):
+    store = LikesStore(args.db)
+    server = await asyncio.start_server(lambda r, w: handle_connection(store, r, w), args.host, args.port,
+                                        backlog=args.backlog)
+    flusher = asyncio.create_task(flush_loop(store, args.flush_interval))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # e.g. Windows; Ctrl+C still raises KeyboardInterrupt
+    addrs = ", ".join(f"{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+    print(f"Serving likes on {addrs} ({len(store.counts)} slugs in {args.db}; flushing every {args.flush_interval:g}s)")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        flusher.cancel()
+        server.close()
+        store.close()
+        print(f"Flushed and closed {args.db}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the /likes and /hit API from memory, persisting to SQLite.")
+    parser.add_argument("--host", default=os.environ.get("LIKES_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LIKES_PORT", "8787")))
+    parser.add_argument("--db", default=os.environ.get("LIKES_DB") or default_db_path(),
+                        help="SQLite file holding the counters (default: .cache/likes.sqlite)")
+    parser.add_argument("--flush-interval", type=float, default=2.0, metavar="SECONDS",
+                        help="how often coalesced hits are written to SQLite (default 2)")
+    parser.add_argument("--backlog", type=int, default=1024, help="listen backlog")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()